@@ -1,5 +1,4 @@
 import asyncio
-import aiohttp
 import random
 import logging
 
@@ -83,14 +82,13 @@ class AvatarManager:
 
         logging.info(f'Fetching avatar from `{url}`')
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    logging.warning(f'Received status {response.status}'
-                                    f' from `{url}`')
-                    return False
+        async with self.bot.http_session.get(url) as response:
+            if response.status != 200:
+                logging.warning(f'Received status {response.status}'
+                                f' from `{url}`')
+                return False
 
-                return await response.read()
+            return await response.read()
 
     async def set_avatar_bytes(self, bytes):
         try:
@@ -1,4 +1,5 @@
 import asyncio
+import aiohttp
 import logging
 import sys
 import os
@@ -10,6 +11,10 @@ from .console_input import ConsoleInput
 from .logging_config import set_up_logging, remove_pushbullet_logger
 from .database import Database
 from .commands import Commands
+from .message_classifier import MessageClassifier
+from .task_supervisor import TaskSupervisor
+from .event_profiler import EventProfiler
+from .loop_watchdog import LoopWatchdog
 from .avatar_manager import AvatarManager
 from . import user_level, send_splitter
 
@@ -25,13 +30,26 @@ class Bot(Client):
 
         self.logger = set_up_logging(settings.bot.logs)
 
+        self._http_session = None
+        self.tasks = TaskSupervisor(self.loop, settings.bot.tasks)
+        self.profiler = EventProfiler(settings.bot.profiler)
+        self.watchdog = LoopWatchdog(self, settings.bot.watchdog)
         self._event_handlers = defaultdict(list)
+        self._message_classes = {}
+        self.message_classifier = MessageClassifier(self)
         self.commands = Commands(self)
-        self.database = Database(self, self.main_settings.db_name)
+        self.database = Database(self, self.main_settings.db_name,
+                                 settings.bot.database)
         self.avatar_manager = AvatarManager(self, settings.bot.avatar)
 
         user_level.owner_usernames = self.main_settings.owner_usernames
         user_level.database = self.database
+        user_level.overwrite_index = user_level.ChannelOverwriteIndex(self)
+
+        if settings.bot.user_levels.cache_ttl:
+            user_level.cache = user_level.UserLevelCache(
+                self, settings.bot.user_levels
+            )
 
         console_variables['bot'] = self
         ConsoleInput(self, console_variables)
@@ -41,9 +59,45 @@ class Bot(Client):
 
     async def close(self):
         remove_pushbullet_logger()
+        self.watchdog.stop()
+        await self.tasks.close()
         await super().close()
+
+        if self._http_session:
+            await self._http_session.close()
+
+        if self.profiler.enabled and self.profiler.settings.dump_file:
+            self.profiler.dump()
+
         self.database.close()
 
+    @property
+    def http_session(self):
+        """A pooled aiohttp session shared by everything the bot fetches"""
+
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = self._create_http_session()
+
+        return self._http_session
+
+    def _create_http_session(self):
+        settings = self.main_settings.http
+
+        connector = aiohttp.TCPConnector(
+            limit=settings.connection_limit,
+            limit_per_host=settings.connection_limit_per_host,
+            ttl_dns_cache=settings.dns_cache_ttl,
+            keepalive_timeout=settings.keepalive_timeout
+        )
+
+        timeout = aiohttp.ClientTimeout(
+            total=settings.total_timeout or None,
+            connect=settings.connect_timeout or None,
+            sock_read=settings.read_timeout or None
+        )
+
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
     def run(self, *args, **kwargs):
         super().run(self.main_settings.token, *args, **kwargs)
 
@@ -61,14 +115,26 @@ class Bot(Client):
 
         return decorator_event
 
-    def register_event(self, event, coro):
+    def register_event(self, event, coro, message_classes=None):
+        """Registers a coroutine to be called on an event
+
+            on_message handlers can pass `message_classes` to only be called
+            for messages the message classifier tagged with one of them."""
+
         if not asyncio.iscoroutinefunction(coro):
             raise TypeError('Events must be coroutine functions')
 
+        if message_classes is not None and event != 'on_message':
+            raise ValueError('Only on_message handlers take message classes')
+
         if coro in self._event_handlers[event]:
             logging.debug(f'{event} already registered, ignoring')
         else:
             self._event_handlers[event].append(coro)
+
+            if message_classes is not None:
+                self._message_classes[coro] = frozenset(message_classes)
+
             logging.debug(f'{event} registered')
 
     def unregister_event(self, event, coro):
@@ -78,10 +144,36 @@ class Bot(Client):
             return
 
         self._event_handlers[event].remove(coro)
+        self._message_classes.pop(coro, None)
         logging.debug(f'{event} unregistered')
 
     def dispatch(self, event, *args, **kwargs):
         super().dispatch(event, *args, **kwargs)
 
-        for handler in self._event_handlers['on_' + event]:
-            self.loop.create_task(handler(*args, **kwargs))
+        handlers = self._event_handlers['on_' + event]
+
+        if event == 'message' and handlers:
+            handlers = self._filter_message_handlers(handlers, args[0])
+
+        for handler in handlers:
+            coro = handler(*args, **kwargs)
+
+            if self.profiler.enabled:
+                coro = self.profiler.wrap(event, handler, coro)
+
+            self.tasks.spawn(event, coro)
+
+    def _filter_message_handlers(self, handlers, message):
+        classes = None
+
+        for handler in handlers:
+            wanted = self._message_classes.get(handler)
+
+            if wanted is not None:
+                if classes is None:
+                    classes = self.message_classifier.classify(message)
+
+                if wanted.isdisjoint(classes):
+                    continue
+
+            yield handler
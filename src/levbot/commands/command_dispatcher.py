@@ -1,3 +1,4 @@
+import time
 import inspect
 import logging
 import asyncio
@@ -12,16 +13,78 @@ Handler = namedtuple('Handler', (
     'user_level',
     'description',
     'syntax',
+    'binder',
+    'rate_limiter',
 ))
 
 
+class Binder:
+    """Maps command text onto a handler's parameters.
+
+        The handler's signature is inspected once, when it's registered,
+        instead of on every call."""
+
+    _positional = (
+        inspect.Parameter.POSITIONAL_ONLY,
+        inspect.Parameter.POSITIONAL_OR_KEYWORD,
+    )
+
+    def __init__(self, coroutine):
+        self.signature = inspect.signature(coroutine)
+        self.parameters = list(self.signature.parameters.values())
+
+        self.parameter_count = len(self.parameters)
+        self.split_limit = self.parameter_count - 2
+        self.required_count = sum(
+            1 for p in self.parameters if p.default is p.empty
+        )
+        self.defaults = {
+            p.name: p.default
+            for p in self.parameters
+            if p.default is not p.empty
+        }
+
+        # anything other than plain positional parameters goes through
+        # inspect, which is slower but handles every case
+        self._simple = all(p.kind in self._positional for p in self.parameters)
+
+    def bind(self, message, attributes):
+        """Returns the arguments to call the handler with
+
+            Raises TypeError when the attributes don't fit the signature"""
+
+        if self.parameter_count > 1:
+            args = [
+                att
+                for att in attributes.split(' ', self.split_limit)
+                if att != ''
+            ]
+
+        else:
+            args = []
+
+        if not self._simple:
+            return self.signature.bind(message, *args).args
+
+        if not self.required_count - 1 <= len(args) < self.parameter_count:
+            raise TypeError('Wrong number of arguments')
+
+        return (message, *args)
+
+
 class CommandDispatcher:
-    def __init__(self, bot, command, *, loop=None):
+    def __init__(self, bot, command, *, loop=None, parent=None, stats=None):
         self._bot = bot
         self._command = command
+        self._parent = parent
+        self._stats = stats
         self._child_dispatchers = {}
         self._handlers = []
 
+        self._user_level = None
+        self._user_level_valid = False
+        self._aliases = None
+
         self.loop = loop or asyncio.get_event_loop()
 
         self.child_dispatchers = MappingProxyType(self._child_dispatchers)
@@ -30,12 +93,31 @@ class CommandDispatcher:
     def command(self):
         return self._command
 
+    @property
+    def full_command(self):
+        if not self._parent:
+            return ''
+
+        parent_command = self._parent.full_command
+        if parent_command:
+            return '{} {}'.format(parent_command, self._command)
+
+        return self._command
+
     @property
     def handlers(self):
         return list(self._handlers)
 
     @property
     def user_level(self):
+        # cached, since every lookup checks it on each node it passes through
+        if not self._user_level_valid:
+            self._user_level = self._get_user_level()
+            self._user_level_valid = True
+
+        return self._user_level
+
+    def _get_user_level(self):
         levels = []
 
         if self._handlers:
@@ -44,10 +126,41 @@ class CommandDispatcher:
         if self.child_dispatchers:
             levels += [c.user_level for c in self.child_dispatchers.values()]
 
-        levels = filter(None.__ne__, levels)
+        levels = [level for level in levels if level is not None]
 
         return min(levels) if levels else None
 
+    def _invalidate_user_level(self):
+        dispatcher = self
+
+        while dispatcher:
+            dispatcher._user_level_valid = False
+            dispatcher = dispatcher._parent
+
+    @property
+    def aliases(self):
+        """Maps each command alias to the command it stands for.
+
+            Aliases are shared by the whole tree and loaded from the database
+            the first time they are needed."""
+
+        if self._parent:
+            return self._parent.aliases
+
+        if self._aliases is None:
+            self._aliases = {
+                alias.alias: alias.command
+                for alias in self._bot.database.CommandAlias.get_list()
+            }
+
+        return self._aliases
+
+    def invalidate_aliases(self):
+        if self._parent:
+            return self._parent.invalidate_aliases()
+
+        self._aliases = None
+
     @property
     def is_leaf(self):
         return not self.child_dispatchers
@@ -63,63 +176,110 @@ class CommandDispatcher:
 
     def _ensure_child_dispatcher(self, command):
         if command not in self._child_dispatchers:
-            dispatcher = self.__class__(self._bot, command)
+            dispatcher = self.__class__(self._bot, command, parent=self)
             self._child_dispatchers[command] = dispatcher
+            self._invalidate_user_level()
 
         return self._child_dispatchers[command]
 
     def register_handler(self, handler, command=None):
         if not command:
             self._handlers.append(handler)
+            self._invalidate_user_level()
             return self
 
         return self.ensure_child_dispatchers(command).register_handler(handler)
 
     def get(self, command_text, user_level):
-        command, sub_commands = (command_text.split(' ', 1) + [''])[:2]
-        command = self._get_command_from_alias(command)
+        words = command_text.split(' ')
+        aliases = self.aliases
+        dispatcher = self
 
-        try:
-            dispatcher = self.child_dispatchers[command]
-            if dispatcher.user_level <= user_level:
-                return dispatcher.get(sub_commands, user_level)
+        for position, word in enumerate(words):
+            child = dispatcher._child_dispatchers.get(
+                aliases.get(word, word)
+            )
 
-        except KeyError:
-            pass
+            if child is None or child.user_level > user_level:
+                return (dispatcher, ' '.join(words[position:]))
 
-        return (self, command_text)
+            dispatcher = child
 
-    def _get_command_from_alias(self, command):
-        alias = self._bot.database.CommandAlias.get_by(alias=command)
-        return alias.command if alias else command
+        return (dispatcher, '')
 
     def dispatch(self, command, message):
+        start = time.perf_counter()
         user_level = UserLevel.get(message.author, message.channel)
+        permission_time = time.perf_counter() - start
+
+        start = time.perf_counter()
         dispatcher, attributes = self.get(command, user_level)
+        timings = {
+            'permission': permission_time,
+            'alias': time.perf_counter() - start,
+        }
+
         handlers = [h
                     for h
                     in dispatcher.handlers
                     if h.user_level <= user_level]
 
         for handler in handlers:
-            self.loop.create_task(self._wrapper(
+            limiter = handler.rate_limiter
+
+            if limiter and user_level < UserLevel.bot_owner:
+                # rejected here as well, so throttled commands never take
+                # up room among everyone else's waiting to run
+                try:
+                    limiter.check(message)
+
+                except CommandException as ex:
+                    self._reject(dispatcher.full_command, message, ex)
+                    continue
+
+            self._bot.tasks.spawn('command', self._wrapper(
                 handler,
                 attributes,
                 message,
-                command
+                dispatcher.full_command,
+                user_level,
+                timings
             ))
 
         return bool(handlers)
 
-    async def _wrapper(self, handler, attributes, message, command):
+    async def _wrapper(self, handler, attributes, message, command,
+                       user_level, timings={}):
+        # the limiter is only acquired once the command actually starts, so
+        # one the task supervisor drops or closes never holds a slot
+        limiter = handler.rate_limiter
+
+        if limiter and user_level < UserLevel.bot_owner:
+            try:
+                limiter.acquire(message)
+
+            except CommandException as ex:
+                return self._reject(command, message, ex)
+
+        else:
+            limiter = None
+
+        timings = dict(timings)
+        outcome = None
+
         try:
-            binding = self._get_binding_for(handler, attributes, message)
-            await handler.coroutine(*binding.args, **binding.kwargs)
+            await self._run(handler, attributes, message, timings)
 
         except CommandException as ex:
+            outcome = 'failure'
             await message.channel.send(str(ex))
 
+        except asyncio.CancelledError:
+            # the bot is shutting down, users don't need to hear about it
+            raise
+
         except BaseException:
+            outcome = 'error'
             logging.exception(
                 'Error in command {} {}'.format(command, attributes)
             )
@@ -131,21 +291,40 @@ class CommandDispatcher:
                 ' fixed up as soon as possible. Thanks!'
             )
 
-    def _get_binding_for(self, handler, attributes, message):
-        signature = inspect.signature(handler.coroutine)
+        finally:
+            if limiter:
+                limiter.release()
+
+            if self._stats:
+                self._stats.record(command, timings, attributes, outcome)
+
+    def _reject(self, command, message, ex):
+        if self._stats:
+            self._stats.record_rejected(command)
+
+        self._bot.tasks.spawn('command_rejected',
+                              message.channel.send(str(ex)))
+
+    async def _run(self, handler, attributes, message, timings):
+        start = time.perf_counter()
+
+        try:
+            args = self._bind(handler, attributes, message)
+
+        finally:
+            timings['bind'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+
+        try:
+            await handler.coroutine(*args)
+
+        finally:
+            timings['handler'] = time.perf_counter() - start
 
+    def _bind(self, handler, attributes, message):
         try:
-            if len(signature.parameters) > 1:
-                attributes = attributes.split(
-                    ' ',
-                    len(signature.parameters) - 2
-                )
-                return signature.bind(
-                    message,
-                    *[att for att in attributes if att is not '']
-                )
-
-            return signature.bind(message)
+            return handler.binder.bind(message, attributes)
 
         except TypeError:
             raise CommandException('Syntax: `{}`'.format(handler.syntax))
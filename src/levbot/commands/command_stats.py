@@ -0,0 +1,155 @@
+import bisect
+import asyncio
+import logging
+
+from collections import defaultdict
+
+
+class Histogram:
+    """Counts durations in fixed, roughly logarithmic buckets"""
+
+    bounds = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, milliseconds):
+        self.buckets[bisect.bisect_left(self.bounds, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        self.max = max(self.max, milliseconds)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        """Returns the upper bound of the bucket holding the percentile"""
+
+        if not self.count:
+            return 0.0
+
+        target = self.count * percent / 100
+        seen = 0
+
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+
+        return self.max
+
+
+class CommandTimings:
+    phases = ('permission', 'alias', 'bind', 'handler')
+
+    def __init__(self):
+        self.histograms = {phase: Histogram() for phase in self.phases}
+        self.total = Histogram()
+
+        self.calls = 0
+        self.failures = 0  # commands answered with a CommandException
+        self.errors = 0  # unexpected exceptions
+        self.rejected = 0  # turned away by a rate limit
+
+
+class CommandStats:
+    """Collects how long each command takes, phase by phase"""
+
+    def __init__(self, bot, settings):
+        self.bot = bot
+        self.settings = settings
+
+        self.commands = defaultdict(CommandTimings)
+
+        if settings.stats_log_interval:
+            bot.loop.create_task(self.log_loop())
+
+    def record(self, command, timings, attributes='', outcome=None):
+        """Records the durations of a single command run
+
+            `timings` maps phases to durations in seconds, `outcome` is
+            'failure' or 'error' if the command didn't succeed."""
+
+        stats = self.commands[command]
+        stats.calls += 1
+
+        if outcome == 'failure':
+            stats.failures += 1
+
+        elif outcome == 'error':
+            stats.errors += 1
+
+        total = 0.0
+        for phase, seconds in timings.items():
+            milliseconds = seconds * 1000
+            stats.histograms[phase].add(milliseconds)
+            total += milliseconds
+
+        stats.total.add(total)
+
+        threshold = self.settings.slow_threshold
+        if threshold and total >= threshold:
+            logging.warning(
+                'Slow command "{}" with arguments "{}" took {:.0f}ms ({})'
+                .format(command, attributes, total, ', '.join(
+                    '{} {:.0f}ms'.format(phase, seconds * 1000)
+                    for phase, seconds in timings.items()
+                ))
+            )
+
+    def record_rejected(self, command):
+        self.commands[command].rejected += 1
+
+    def get_report_lines(self):
+        yield '{:<30} {:>7} {:>6} {:>6} {:>8} {:>8} {:>8}'.format(
+            'command', 'calls', 'fail', 'error', 'mean', 'p95', 'max'
+        )
+
+        for command, stats in sorted(self.commands.items(),
+                                     key=lambda item: -item[1].total.total):
+            yield '{:<30} {:>7} {:>6} {:>6} {:>6.0f}ms {:>6.0f}ms {:>6.0f}ms' \
+                .format(command[:30], stats.calls, stats.failures,
+                        stats.errors, stats.total.mean,
+                        stats.total.percentile(95), stats.total.max)
+
+    def get_phase_lines(self, command):
+        stats = self.commands.get(command)
+        if not stats:
+            return
+
+        yield '{:<12} {:>8} {:>8} {:>8} {:>8}'.format(
+            'phase', 'mean', 'p50', 'p95', 'max'
+        )
+
+        for phase, histogram in stats.histograms.items():
+            yield '{:<12} {:>6.1f}ms {:>6.1f}ms {:>6.1f}ms {:>6.1f}ms'.format(
+                phase, histogram.mean, histogram.percentile(50),
+                histogram.percentile(95), histogram.max
+            )
+
+        if stats.rejected:
+            yield '{} calls rejected by rate limits'.format(stats.rejected)
+
+    async def log_loop(self):
+        await self.bot.wait_until_ready()
+
+        while not self.bot.is_closed():
+            await asyncio.sleep(self.settings.stats_log_interval * 60)
+
+            calls = sum(stats.calls for stats in self.commands.values())
+            errors = sum(stats.errors for stats in self.commands.values())
+            slowest = max(self.commands.items(), default=None,
+                          key=lambda item: item[1].total.max)
+
+            logging.info(
+                'Commands: {} calls, {} errors{}'.format(
+                    calls, errors,
+                    ', slowest "{}" at {:.0f}ms'.format(
+                        slowest[0], slowest[1].total.max
+                    ) if slowest else ''
+                )
+            )
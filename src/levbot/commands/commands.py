@@ -1,19 +1,29 @@
+import re
 import inspect
 
 from discord.abc import PrivateChannel
 from ..user_level import UserLevel
 from . import CommandDispatcher, Handler
+from .command_dispatcher import Binder
+from .rate_limiter import RateLimiter
+from .command_stats import CommandStats
 from . import handlers
 
 
 class Commands:
     def __init__(self, bot, *, loop=None):
         self.bot = bot
-        self.root = CommandDispatcher(bot, '__root__', loop=loop)
+        self.stats = CommandStats(bot, bot.settings.bot.commands)
+        self.root = CommandDispatcher(bot, '__root__', loop=loop,
+                                      stats=self.stats)
+
+        self._prefixes = None
 
         self._register_sub_handlers()
 
-        bot.register_event('on_message', self._on_message)
+        bot.message_classifier.add_pattern('command', self._get_prefix_pattern)
+        bot.register_event('on_message', self._on_message,
+                           message_classes=('command', 'private'))
 
     def _register_sub_handlers(self):
         for sub_handler in dir(handlers):
@@ -26,23 +36,42 @@ class Commands:
         handler = self.build_handler(command, coroutine, **kwargs)
         return self.root.register_handler(handler, command)
 
-    def build_handler(self, command, coroutine, **kwargs):
+    def build_handler(self, command, coroutine, user_rate=None,
+                      guild_rate=None, command_rate=None,
+                      max_concurrency=None, **kwargs):
+        """Builds a Handler for a coroutine
+
+            `user_rate`, `guild_rate` and `command_rate` limit how often the
+            command can be used, as `(number of calls, per seconds)`, and
+            `max_concurrency` how many times it can run at once."""
+
+        binder = Binder(coroutine)
+        rate_limiter = None
+
+        if user_rate or guild_rate or command_rate or max_concurrency:
+            rate_limiter = RateLimiter(user_rate, guild_rate, command_rate,
+                                       max_concurrency)
+
         defaults = {
             'user_level': UserLevel.guild_bot_admin,
             'description': inspect.getdoc(coroutine) or '',
-            'syntax': self.get_syntax_for(coroutine, command),
+            'binder': binder,
+            'rate_limiter': rate_limiter,
         }
 
         defaults.update(kwargs)
 
-        return Handler(coroutine, **defaults)
+        if 'syntax' not in defaults:
+            defaults['syntax'] = self.get_syntax_for(binder, command)
 
-    def get_syntax_for(self, coroutine, command):
-        parameters = list(inspect.signature(coroutine).parameters.values())
+        return Handler(coroutine, **defaults)
 
+    def get_syntax_for(self, binder, command):
         return '{} {}'.format(
             command,
-            ' '.join(self._get_parameter_syntax(p) for p in parameters[1:])
+            ' '.join(
+                self._get_parameter_syntax(p) for p in binder.parameters[1:]
+            )
         )
 
     def _get_parameter_syntax(self, parameter):
@@ -63,13 +92,21 @@ class Commands:
 
         return False
 
-    def _get_command(self, message):
-        prefixes = (
-            '<@{.id}>'.format(self.bot.user),  # standard mention
-            '<@!{.id}>'.format(self.bot.user)  # nickname mention
-        )
+    @property
+    def prefixes(self):
+        if self._prefixes is None:
+            self._prefixes = (
+                '<@{.id}>'.format(self.bot.user),  # standard mention
+                '<@!{.id}>'.format(self.bot.user)  # nickname mention
+            )
 
-        for prefix in prefixes:
+        return self._prefixes
+
+    def _get_prefix_pattern(self, bot):
+        return '^(?:{})'.format('|'.join(map(re.escape, self.prefixes)))
+
+    def _get_command(self, message):
+        for prefix in self.prefixes:
             if message.content.startswith(prefix):
                 return message.content[len(prefix):].lstrip()
 
@@ -1,7 +1,11 @@
+import os
 import discord
 import logging
+import sqlite3
+import tempfile
 
 from collections import defaultdict
+from contextlib import closing
 from datetime import datetime
 from discord import NotFound, Forbidden, File
 from ...user_level import UserLevel
@@ -16,12 +20,16 @@ class BotCommands:
         commands.register_handler(
             'list all channels',
             self.cmd_list_all_channels,
-            user_level=UserLevel.global_bot_admin
+            user_level=UserLevel.global_bot_admin,
+            user_rate=(2, 60),
+            max_concurrency=1
         )
         commands.register_handler(
             'list all users',
             self.cmd_list_all_users,
-            user_level=UserLevel.global_bot_admin
+            user_level=UserLevel.global_bot_admin,
+            user_rate=(2, 60),
+            max_concurrency=1
         )
         commands.register_handler(
             'quit',
@@ -46,7 +54,10 @@ class BotCommands:
         commands.register_handler(
             'backup',
             self.cmd_backup,
-            user_level=UserLevel.guild_bot_admin
+            user_level=UserLevel.guild_bot_admin,
+            user_rate=(1, 60),
+            guild_rate=(2, 60),
+            max_concurrency=3
         )
 
         if self.bot.main_settings.offer_invite_link:
@@ -206,10 +217,26 @@ class BotCommands:
             Snapshots are attached as .db files and are created when requested.
             The bot will also reply with the current timestamp."""
 
-        await message.author.send(
-            'BACKUP ' + datetime.now().isoformat(' '),
-            file=File(self.bot.main_settings.db_name)
-        )
+        db_name = self.bot.main_settings.db_name
+        fd, path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+
+        try:
+            # copying the file directly would miss anything still in the WAL
+            await self.bot.database.aio.run(self._write_backup, path)
+
+            await message.author.send(
+                'BACKUP ' + datetime.now().isoformat(' '),
+                file=File(path, filename=os.path.basename(db_name))
+            )
+
+        finally:
+            os.remove(path)
+
+    @staticmethod
+    def _write_backup(connection, path):
+        with closing(sqlite3.connect(path)) as backup:
+            connection.backup(backup)
 
     async def cmd_source(self, message):
         """Sends a link in a PM to view the bot source code."""
@@ -0,0 +1,79 @@
+from ...user_level import UserLevel
+
+
+class StatsCommands:
+    def __init__(self, commands):
+        self.commands = commands
+        self.bot = commands.bot
+
+        self.register()
+
+    def register(self):
+        self.commands.register_handler(
+            'stats commands',
+            self.cmd_stats_commands,
+            user_level=UserLevel.bot_owner
+        )
+        self.commands.register_handler(
+            'stats tasks',
+            self.cmd_stats_tasks,
+            user_level=UserLevel.bot_owner
+        )
+        self.commands.register_handler(
+            'stats stalls',
+            self.cmd_stats_stalls,
+            user_level=UserLevel.bot_owner
+        )
+
+    async def cmd_stats_commands(self, message, command=''):
+        """Shows how long commands have been taking.
+
+            Name a command to see the time spent in each step of running it:
+            checking permissions, resolving aliases, parsing arguments and
+            running the command itself."""
+
+        stats = self.commands.stats
+
+        if command:
+            lines = list(stats.get_phase_lines(command))
+
+            if not lines:
+                await message.channel.send(
+                    'No stats for `{}` yet.'.format(command)
+                )
+                return
+
+        else:
+            lines = list(stats.get_report_lines())
+
+            if len(lines) == 1:
+                await message.channel.send('No commands have run yet.')
+                return
+
+        await message.channel.send('```\n{}\n```'.format('\n'.join(lines)))
+
+    async def cmd_stats_tasks(self, message):
+        """Shows running, queued and dropped event handlers per event"""
+
+        lines = self.bot.tasks.get_report_lines()
+        await message.channel.send('```\n{}\n```'.format('\n'.join(lines)))
+
+    async def cmd_stats_stalls(self, message):
+        """Shows where the event loop was blocked most often"""
+
+        watchdog = self.bot.watchdog
+
+        if not watchdog.settings.enabled:
+            await message.channel.send('Stall detection is disabled.')
+            return
+
+        if not watchdog.stalls:
+            await message.channel.send('No stalls detected.')
+            return
+
+        lines = list(watchdog.get_report_lines())
+        lines.append('Longest stall: {:.0f}ms'.format(
+            watchdog.longest_stall * 1000
+        ))
+
+        await message.channel.send('```\n{}\n```'.format('\n'.join(lines)))
@@ -0,0 +1,137 @@
+import time
+import math
+
+from collections import OrderedDict
+from .command_dispatcher import CommandException
+
+
+class RateLimited(CommandException):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate, per):
+        self.capacity = rate
+        self.refill_rate = rate / per
+
+        self.tokens = rate
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.refill_rate
+        )
+        self.updated = now
+
+    def get_delay(self):
+        """Returns how many seconds until a token is available"""
+
+        self._refill()
+
+        if self.tokens >= 1:
+            return 0
+
+        return (1 - self.tokens) / self.refill_rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """Limits how often and how many times at once a handler can run.
+
+        Rates are given as `(number of calls, per seconds)` and are tracked
+        separately per user, per guild and for the command as a whole."""
+
+    max_buckets = 1000
+
+    def __init__(self, user_rate=None, guild_rate=None, command_rate=None,
+                 max_concurrency=None):
+        self.user_rate = user_rate
+        self.guild_rate = guild_rate
+        self.max_concurrency = max_concurrency
+
+        self._user_buckets = OrderedDict()
+        self._guild_buckets = OrderedDict()
+        self._command_bucket = TokenBucket(*command_rate) if command_rate \
+            else None
+
+        self.active = 0
+        self.rejected = 0
+
+    def check(self, message):
+        """Raises RateLimited if the handler can't run for a message right
+            now, without reserving anything"""
+
+        self._check(self._get_buckets(message))
+
+    def acquire(self, message):
+        """Reserves a slot for running the handler for a message
+
+            Raises RateLimited if any of the limits was reached. Every
+            successful call must be followed by a call to `release`."""
+
+        buckets = self._get_buckets(message)
+        self._check(buckets)
+
+        for bucket in buckets:
+            bucket.take()
+
+        self.active += 1
+
+    def _check(self, buckets):
+        if self.max_concurrency and self.active >= self.max_concurrency:
+            self.rejected += 1
+            raise RateLimited(
+                'This command is already running as many times as it can,'
+                ' please try again once one of them is done.'
+            )
+
+        delay = max((bucket.get_delay() for bucket in buckets), default=0)
+
+        if delay:
+            self.rejected += 1
+            raise RateLimited(
+                'This command is being used too often, please try again in'
+                ' {} seconds.'.format(math.ceil(delay))
+            )
+
+    def release(self):
+        self.active -= 1
+
+    def _get_buckets(self, message):
+        buckets = []
+
+        if self.user_rate:
+            buckets.append(self._get_bucket(
+                self._user_buckets, message.author.id, self.user_rate
+            ))
+
+        if self.guild_rate and message.guild:
+            buckets.append(self._get_bucket(
+                self._guild_buckets, message.guild.id, self.guild_rate
+            ))
+
+        if self._command_bucket:
+            buckets.append(self._command_bucket)
+
+        return buckets
+
+    def _get_bucket(self, buckets, key, rate):
+        try:
+            buckets.move_to_end(key)
+            return buckets[key]
+
+        except KeyError:
+            pass
+
+        # the least recently used bucket has had the longest to refill, so
+        # it's the one closest to behaving like a new one
+        while len(buckets) >= self.max_buckets:
+            buckets.popitem(last=False)
+
+        bucket = buckets[key] = TokenBucket(*rate)
+        return bucket
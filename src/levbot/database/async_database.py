@@ -0,0 +1,181 @@
+import sqlite3
+import asyncio
+import logging
+import pathlib
+import threading
+
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+
+class AsyncDatabase:
+    """Runs queries off the event loop.
+
+    Writes go through a single dedicated thread so they stay in order, while
+    reads are spread over a small pool of read-only connections."""
+
+    def __init__(self, database, db_name, readers=4, *, loop=None):
+        self._database = database
+        self.db_name = db_name
+
+        self.loop = loop or asyncio.get_event_loop()
+
+        self._writer = ThreadPoolExecutor(1, 'db-writer')
+        self._readers = ThreadPoolExecutor(readers, 'db-reader')
+
+        # in-memory databases can't be shared between connections, so calls
+        # run directly on the database's own connection instead
+        self._inline = db_name == ':memory:'
+
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def close(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+
+            self._connections.clear()
+
+    def _connect(self, read_only):
+        cached_statements = self._database.settings.cached_statements
+
+        if read_only:
+            uri = pathlib.Path(self.db_name).absolute().as_uri() + '?mode=ro'
+            connection = sqlite3.connect(uri, uri=True,
+                                         check_same_thread=False,
+                                         cached_statements=cached_statements)
+
+        else:
+            connection = sqlite3.connect(self.db_name,
+                                         check_same_thread=False,
+                                         cached_statements=cached_statements)
+
+        connection.row_factory = sqlite3.Row
+        self._database.configure_connection(connection, read_only)
+
+        with self._connections_lock:
+            self._connections.append(connection)
+
+        logging.debug('Opened {} database connection in {}'.format(
+            'read-only' if read_only else 'writable',
+            threading.current_thread().name
+        ))
+
+        return connection
+
+    def _get_connection(self, read_only):
+        try:
+            return self._local.connection
+
+        except AttributeError:
+            self._local.connection = self._connect(read_only)
+            return self._local.connection
+
+    async def run(self, func, *args):
+        """Calls `func(connection, *args)` on the writer thread"""
+
+        return await self._run_write(func, *args)
+
+    def _run_write(self, func, *args):
+        if self._inline:
+            return self._run_inline(func, *args)
+
+        return self.loop.run_in_executor(self._writer, self._call,
+                                         False, func, *args)
+
+    def _run_read(self, func, *args):
+        if self._inline:
+            return self._run_inline(func, *args)
+
+        return self.loop.run_in_executor(self._readers, self._call,
+                                         True, func, *args)
+
+    def _run_inline(self, func, *args):
+        future = self.loop.create_future()
+
+        try:
+            future.set_result(func(self._database.database, *args))
+
+        except Exception as ex:
+            future.set_exception(ex)
+
+        return future
+
+    def _can_commit(self, commit):
+        # inline calls would otherwise commit a transaction that is open on
+        # the shared connection
+        return commit and not (self._inline and self._database.in_transaction)
+
+    def _call(self, read_only, func, *args):
+        return func(self._get_connection(read_only), *args)
+
+    async def execute(self, query, parameters=(), script=False, commit=True):
+        parameters = self._database._convert_parameters(parameters)
+
+        return await self._run_write(self._execute, query, parameters,
+                                     script, self._can_commit(commit))
+
+    @staticmethod
+    def _execute(connection, query, parameters, script, commit):
+        with closing(connection.cursor()) as cursor:
+            if script:
+                cursor.executescript(query)
+
+            else:
+                cursor.execute(query, parameters)
+
+            if commit:
+                connection.commit()
+
+            return cursor.lastrowid
+
+    async def fetch_all(self, query, parameters=()):
+        parameters = self._database._convert_parameters(parameters)
+
+        return await self._run_read(self._fetch_all, query, parameters)
+
+    @staticmethod
+    def _fetch_all(connection, query, parameters):
+        with closing(connection.cursor()) as cursor:
+            cursor.execute(query, parameters)
+
+            return cursor.fetchall()
+
+    async def fetch_row(self, query, parameters=()):
+        parameters = self._database._convert_parameters(parameters)
+
+        return await self._run_read(self._fetch_row, query, parameters)
+
+    @staticmethod
+    def _fetch_row(connection, query, parameters):
+        with closing(connection.cursor()) as cursor:
+            cursor.execute(query, parameters)
+
+            return cursor.fetchone()
+
+    async def fetch_value(self, query, parameters=(), *args, **kwargs):
+        try:
+            return (await self.fetch_row(query, parameters))[0]
+
+        except IndexError:
+            if args:
+                return args[0]
+
+            return kwargs.get('default', None)
+
+    async def insert(self, table, fields):
+        query = self._database.get_insert_query(table, fields)
+
+        return await self.execute(query, fields)
+
+    async def update(self, table, fields, where_query='', where_args={},
+                     **kwargs):
+        query = self._database.get_update_query(table, fields, where_query,
+                                                where_args, **kwargs)
+
+        return await self.execute(query, fields)
@@ -16,9 +16,16 @@ class ModelCommands:
                 self.get_partial(command, model),
                 user_level=UserLevel.global_bot_admin,
                 description=self.get_description(command, model),
-                syntax=self.get_syntax(command, model)
+                syntax=self.get_syntax(command, model),
+                **self.get_limits(command)
             )
 
+    def get_limits(self, command):
+        if command == 'list':
+            return {'user_rate': (3, 60), 'max_concurrency': 1}
+
+        return {}
+
     def get_partial(self, command, model):
         func_name = 'cmd_{}'.format(command)
         native_func = getattr(self, func_name)
@@ -197,20 +204,21 @@ class ModelCommands:
         else:
             pairs = []
 
-        models = self.filter_model(model, pairs)
+        found = False
 
-        if not models:
-            return await message.channel.send(
-                'No `{}` records found'.format(model_name)
+        # send a page at a time rather than loading the whole table
+        async for models in self.filter_model(model, pairs):
+            found = True
+
+            await message.channel.send(
+                '\u200C\n' + '\n'.join(str(model) for model in models)
             )
 
-        await message.channel.send(
-            '\u200C\n' + '\n'.join(str(model) for model in models)
-        )
+        if not found:
+            await message.channel.send(
+                'No `{}` records found'.format(model_name)
+            )
 
     def filter_model(self, model, pairs):
-        if pairs:
-            list_filter = {field: value for field, value in pairs}
-            return model.get_list_by(**list_filter)
-
-        return model.get_list()
+        list_filter = {field: value for field, value in pairs}
+        return model.aiter_pages_by(**list_filter)
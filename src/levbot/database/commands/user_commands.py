@@ -48,6 +48,9 @@ class UserCommands:
             'list users',
             self.cmd_list_users,
             user_level=self.user_level,
+            user_rate=(3, 60),
+            guild_rate=(5, 60),
+            max_concurrency=2,
             description=(
                 'Lists users with admin or blacklisted status given through'
                 ' the `add user` command.\n'
@@ -199,19 +202,28 @@ class UserCommands:
 
     async def cmd_list_users(self, message, listtype='both', guildname='',
                              username=''):
-        users = self.bot.database.User.get_list()
-
         if guildname:
             guild = self.get_guild(guildname, message)
         else:
             guild = None
 
-        text = await self.get_list_text(users, username, listtype, guild,
-                                        message)
+        found = False
+
+        async for users in self.bot.database.User.aiter_pages_by():
+            pieces = await self.get_list_pieces(users, username, listtype,
+                                                guild, message)
 
-        await message.channel.send(text)
+            if pieces:
+                found = True
+                await message.channel.send(
+                    '\u200C\n{}'.format('\n'.join(pieces))
+                )
 
-    async def get_list_text(self, users, username, listtype, guild, message):
+        if not found:
+            await message.channel.send('No `users` found.')
+
+    async def get_list_pieces(self, users, username, listtype, guild,
+                              message):
         pieces = []
 
         for user in users:
@@ -229,10 +241,7 @@ class UserCommands:
                     await self.get_list_text_piece(user, userguild, guild)
                 )
 
-        if not pieces:
-            return 'No `users` found.'
-
-        return '\u200C\n{}'.format('\n'.join(pieces))
+        return pieces
 
     def check_listtype(self, userguild, listtype):
         if listtype == 'admin':
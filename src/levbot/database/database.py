@@ -1,18 +1,48 @@
 import sqlite3
 import logging
 
-from contextlib import closing
+from contextlib import closing, contextmanager
+from ..settings import SettingsKeyError
+from .async_database import AsyncDatabase
+from .maintenance import DatabaseMaintenance
 from .models import CommandAlias, User, UserGuild
 from .commands.model_commands import ModelCommands
 from .commands.user_commands import UserCommands
 
 
 class Database:
-    def __init__(self, bot, db_name):
+    pragma_choices = {
+        'journal_mode': ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL',
+                         'OFF'),
+        'synchronous': ('OFF', 'NORMAL', 'FULL', 'EXTRA'),
+        'temp_store': ('DEFAULT', 'FILE', 'MEMORY'),
+        'auto_vacuum': ('NONE', 'FULL', 'INCREMENTAL'),
+    }
+
+    def __init__(self, bot, db_name, settings):
         self.bot = bot
+        self.settings = settings
 
-        self.database = sqlite3.connect(db_name)
+        self._check_settings()
+
+        self.database = sqlite3.connect(
+            db_name,
+            cached_statements=settings.cached_statements
+        )
         self.database.row_factory = sqlite3.Row
+        self._transaction_depth = 0
+        self._changed_models = set()
+
+        self._insert_queries = {}
+        self._update_queries = {}
+
+        self.configure_connection(self.database)
+        self._ensure_auto_vacuum()
+        self._log_pragmas()
+
+        self.aio = AsyncDatabase(self, db_name, settings.read_connections,
+                                 loop=bot.loop)
+        self.maintenance = DatabaseMaintenance(bot, self, settings)
 
         self.model_commands = ModelCommands(bot, self)
         UserCommands(bot)
@@ -22,14 +52,129 @@ class Database:
 
         self._is_open = True
 
+    def _check_settings(self):
+        for pragma, choices in self.pragma_choices.items():
+            value = getattr(self.settings, pragma)
+
+            if value.upper() not in choices:
+                raise SettingsKeyError(
+                    f'Database {pragma} `{value}` not recognised.'
+                )
+
+    def configure_connection(self, connection, read_only=False):
+        """Applies the per-connection pragmas from the settings.
+
+            The journal mode is stored in the database file itself, so it is
+            only set from writable connections."""
+
+        pragmas = [
+            ('synchronous', self.settings.synchronous.upper()),
+            ('cache_size', int(self.settings.cache_size)),
+            ('mmap_size', int(self.settings.mmap_size)),
+            ('busy_timeout', int(self.settings.busy_timeout)),
+            ('temp_store', self.settings.temp_store.upper()),
+        ]
+
+        if not read_only:
+            pragmas.insert(0, ('journal_mode',
+                               self.settings.journal_mode.upper()))
+
+        # pragma values can't be bound as parameters, but they have all been
+        # checked against pragma_choices or converted to int above
+        for pragma, value in pragmas:
+            connection.execute(f'PRAGMA {pragma} = {value}').fetchall()
+
+    def _ensure_auto_vacuum(self):
+        modes = self.pragma_choices['auto_vacuum']
+        wanted = self.settings.auto_vacuum.upper()
+        current = modes[self.fetch_value('PRAGMA auto_vacuum')]
+
+        if current == wanted:
+            return
+
+        # changing auto_vacuum on an existing database only takes effect
+        # after a full VACUUM, so this is a one-off cost
+        logging.info(f'Converting database from auto_vacuum={current} to'
+                     f' auto_vacuum={wanted}')
+
+        self.execute(f'PRAGMA auto_vacuum = {wanted}')
+        self.execute('VACUUM')
+
+    def _log_pragmas(self):
+        values = []
+
+        for pragma in ('journal_mode', 'synchronous', 'cache_size',
+                       'mmap_size', 'busy_timeout', 'temp_store',
+                       'auto_vacuum'):
+            # some pragmas return nothing when unsupported (e.g. mmap_size
+            # for in-memory databases)
+            row = self.fetch_row(f'PRAGMA {pragma}')
+            values.append('{}={}'.format(pragma, row[0] if row else 'n/a'))
+
+        logging.info('Database opened with ' + ', '.join(values))
+
     @property
     def is_open(self):
         return self._is_open
 
+    @property
+    def batch_size(self):
+        return self.settings.batch_size
+
+    @property
+    def in_transaction(self):
+        return self._transaction_depth > 0
+
+    @contextmanager
+    def transaction(self):
+        """Groups everything executed inside it into a single commit.
+
+            Transactions can be nested, in which case only the outermost one
+            commits. Any exception rolls the whole transaction back."""
+
+        if not self.database.in_transaction:
+            self.database.execute('BEGIN')
+
+        self._transaction_depth += 1
+
+        try:
+            yield self
+
+        except BaseException:
+            self._transaction_depth -= 1
+            if not self.in_transaction:
+                self.database.rollback()
+                self._forget_changed_models()
+
+            raise
+
+        self._transaction_depth -= 1
+        if not self.in_transaction:
+            self.database.commit()
+            self._changed_models.clear()
+
+    def model_changed(self, model_class):
+        """Notes a cached model saved or deleted inside a transaction"""
+
+        if self.in_transaction:
+            self._changed_models.add(model_class)
+
+    def _forget_changed_models(self):
+        # the caches were updated as if the transaction would commit, so
+        # anything they hold for these models may not match the rows anymore
+        for model_class in self._changed_models:
+            model_class._cache.clear()
+
+        self._changed_models.clear()
+
     def close(self):
         if self.is_open:
-            logging.info('Vacuuming and closing database')
-            self.execute('VACUUM')
+            self.aio.close()
+
+            # space is reclaimed by the maintenance task instead of a full
+            # VACUUM, so shutting down (and restarting) stays quick
+            logging.info('Checkpointing and closing database')
+            self.fetch_all('PRAGMA wal_checkpoint(TRUNCATE)')
             self.database.close()
             self._is_open = False
 
@@ -67,17 +212,34 @@ class Database:
         parameters = self._convert_parameters(parameters)
 
         with closing(self.database.cursor()) as cursor:
-            if script:
+            if script and self.in_transaction:
+                # executescript would commit the open transaction first
+                for statement in self._split_script(query):
+                    cursor.execute(statement)
+
+            elif script:
                 cursor.executescript(query)
 
             else:
                 cursor.execute(query, parameters)
 
-            if commit:
+            if commit and not self.in_transaction:
                 self.database.commit()
 
             return cursor.lastrowid
 
+    def _split_script(self, script):
+        statement = ''
+
+        for piece in script.split(';'):
+            statement += piece + ';'
+
+            if sqlite3.complete_statement(statement):
+                if statement.strip(' \t\r\n;'):
+                    yield statement
+
+                statement = ''
+
     def _convert_parameters(self, parameters):
         if isinstance(parameters, (tuple, list, dict)):
             return parameters
@@ -92,6 +254,19 @@ class Database:
 
             return cursor.fetchall()
 
+    def iter_all(self, query, parameters=(), batch_size=None):
+        parameters = self._convert_parameters(parameters)
+
+        with closing(self.database.cursor()) as cursor:
+            cursor.execute(query, parameters)
+
+            while True:
+                rows = cursor.fetchmany(batch_size or self.batch_size)
+                if not rows:
+                    return
+
+                yield from rows
+
     def fetch_row(self, query, parameters=()):
         parameters = self._convert_parameters(parameters)
 
@@ -111,6 +286,17 @@ class Database:
             return kwargs.get('default', None)
 
     def insert(self, table, fields):
+        return self.execute(self.get_insert_query(table, fields), fields)
+
+    def get_insert_query(self, table, fields):
+        key = (table, tuple(fields))
+
+        try:
+            return self._insert_queries[key]
+
+        except KeyError:
+            pass
+
         query = 'INSERT INTO {} ({}) VALUES ({})'
 
         fieldnames = fields.keys()
@@ -121,10 +307,18 @@ class Database:
             ','.join(':{}'.format(name) for name in fieldnames)
         )
 
-        return self.execute(query, fields)
+        self._insert_queries[key] = query
+        return query
 
     def update(self, table, fields, where_query='', where_args={}, **kwargs):
-        query = 'UPDATE {} SET {} WHERE {}'
+        query = self.get_update_query(table, fields, where_query, where_args,
+                                      **kwargs)
+
+        return self.execute(query, fields)
+
+    def get_update_query(self, table, fields, where_query='', where_args={},
+                         **kwargs):
+        """Builds an UPDATE query, adding the where arguments to `fields`"""
 
         fieldnames = tuple(fields.keys())
 
@@ -135,6 +329,18 @@ class Database:
             fields.update({
                 'where_' + key: value for key, value in kwargs.items()
             })
+
+        key = (table, fieldnames, where_query, tuple(kwargs))
+
+        try:
+            return self._update_queries[key]
+
+        except KeyError:
+            pass
+
+        query = 'UPDATE {} SET {} WHERE {}'
+
+        if not where_query:
             where_query = ' AND '.join(
                 '{0} = :where_{0}'.format(name) for name in kwargs.keys()
             )
@@ -145,4 +351,5 @@ class Database:
             where_query
         )
 
-        return self.execute(query, fields)
+        self._update_queries[key] = query
+        return query
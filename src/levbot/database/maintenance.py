@@ -0,0 +1,67 @@
+import time
+import asyncio
+import logging
+
+
+class DatabaseMaintenance:
+    def __init__(self, bot, database, settings):
+        self.bot = bot
+        self.database = database
+        self.settings = settings
+
+        self.last_analyze = time.monotonic()
+
+        if settings.maintenance_interval:
+            self.bot.loop.create_task(self.maintenance_loop())
+
+    async def maintenance_loop(self):
+        await self.bot.wait_until_ready()
+
+        while not self.bot.is_closed():
+            await asyncio.sleep(self.settings.maintenance_interval * 60)
+
+            if not self.database.is_open:
+                return
+
+            try:
+                await self.run_maintenance()
+
+            except Exception:
+                logging.exception('Error in database maintenance')
+
+    async def run_maintenance(self):
+        analyze = self.settings.analyze_interval and (
+            time.monotonic() - self.last_analyze
+            >= self.settings.analyze_interval * 60
+        )
+
+        start = time.perf_counter()
+        freed = await self.database.aio.run(self._maintain, analyze)
+        duration = time.perf_counter() - start
+
+        if analyze:
+            self.last_analyze = time.monotonic()
+
+        logging.info(
+            f'Database maintenance freed {freed} pages'
+            f'{" and analyzed tables" if analyze else ""}'
+            f' in {duration:.2f}s'
+        )
+
+    def _maintain(self, connection, analyze):
+        before = connection.execute('PRAGMA freelist_count').fetchone()[0]
+
+        # execute() only steps this pragma once, freeing a single page,
+        # while executescript() runs it to completion
+        pages = int(self.settings.vacuum_pages)
+        connection.executescript(f'PRAGMA incremental_vacuum({pages});')
+
+        if analyze:
+            connection.execute('ANALYZE')
+
+        connection.execute('PRAGMA optimize').fetchall()
+        connection.commit()
+
+        after = connection.execute('PRAGMA freelist_count').fetchone()[0]
+
+        return before - after
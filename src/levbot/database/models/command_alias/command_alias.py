@@ -10,3 +10,25 @@ class CommandAlias(Model):
     }
 
     _indexes = ['alias']
+
+    _cache_size = 1000
+
+    def save(self):
+        super().save()
+        self._forget_aliases()
+
+    async def asave(self):
+        await super().asave()
+        self._forget_aliases()
+
+    def delete(self):
+        super().delete()
+        self._forget_aliases()
+
+    async def adelete(self):
+        await super().adelete()
+        self._forget_aliases()
+
+    def _forget_aliases(self):
+        # the command dispatcher keeps its own table of aliases in memory
+        self.bot.commands.root.invalidate_aliases()
@@ -4,6 +4,7 @@ import logging
 
 from types import MappingProxyType
 from dataclasses import dataclass
+from .model_cache import ModelCache
 
 
 @dataclass
@@ -21,20 +22,40 @@ class Optional(FieldDefinition):
     pass
 
 
-class Model(abc.ABC):
+class ModelMeta(abc.ABCMeta):
+    """Gives each model with `_fields` a slot per field.
+
+        Any names in the model's own `__slots__` (e.g. for caching related
+        objects) are kept alongside them."""
+
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        fields = namespace.get('_fields')
+
+        if fields is not None:
+            namespace['__slots__'] = tuple(fields) \
+                + tuple(namespace.get('__slots__', ()))
+
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+class Model(abc.ABC, metaclass=ModelMeta):
+    __slots__ = ('_id', )
+
     # these attributes are to be overridden in child classes
     _table = None
     _fields = None
     _indexes = []
+    _unique_indexes = []
+
+    # set above 0 to keep up to this many instances in an identity map, so
+    # lookups by id or by a declared index can skip the database
+    _cache_size = 0
 
     def __init__(self):
         self._id = None
 
-        for field, default in self.fields.items():
-            if isinstance(default, FieldDefinition):
-                setattr(self, field, None)
-            else:
-                setattr(self, field, default)
+        for field, default in self._defaults:
+            setattr(self, field, default)
 
     def __repr__(self):
         objfmt = '{name} `({id!r})`: {fields}'
@@ -55,9 +76,12 @@ class Model(abc.ABC):
 
         cls._check_attributes()
         cls._init_fields()
+        cls._init_cache()
+        cls._init_queries()
 
         cls._build_table_if_necessary()
         cls._update_table_if_necessary()
+        cls._reconcile_indexes()
 
     @classmethod
     def _check_attributes(cls):
@@ -69,6 +93,82 @@ class Model(abc.ABC):
     def _init_fields(cls):
         cls._fields = MappingProxyType(cls._fields)
 
+        convert = lambda v: None if isinstance(v, FieldDefinition) else v
+        cls._defaults = tuple(
+            (field, convert(default)) for field, default in cls._fields.items()
+        )
+
+        cls._build_from_row = staticmethod(cls._compile_row_builder())
+
+    @classmethod
+    def _compile_row_builder(cls):
+        """Builds a function turning a row into a model instance.
+
+            Rows must hold `id` followed by every field in `_fields` order,
+            which is what `_columns` selects. Fields with a bool default are
+            stored as integers, so they get converted back here."""
+
+        lines = [
+            'def build_from_row(row):',
+            '    model = new(cls)',
+            '    model._id = row[0]',
+        ]
+
+        for position, (field, default) in enumerate(cls._fields.items(), 1):
+            value = f'row[{position}]'
+
+            if type(default) is bool:
+                value = f'bool({value})'
+
+            lines.append(f'    model.{field} = {value}')
+
+        lines.append('    return model')
+
+        namespace = {'new': cls.__new__, 'cls': cls}
+        exec('\n'.join(lines), namespace)
+
+        return namespace['build_from_row']
+
+    @classmethod
+    def _init_cache(cls):
+        cls._cache = ModelCache(cls, cls._cache_size) \
+            if cls._cache_size else None
+
+    @classmethod
+    def _init_queries(cls):
+        # SQL text is built once per distinct set of filter columns and then
+        # reused, leaving sqlite's own statement cache to skip re-parsing
+        cls._list_by_queries = {}
+        cls._list_queries = {}
+        cls._page_queries = {}
+
+        cls._columns = ','.join(['id'] + list(cls._fields))
+
+        cls._delete_query = """
+            DELETE FROM
+                {}
+            WHERE
+                id = ?
+        """.format(cls._table)
+
+        cls._row_query = """
+            SELECT
+                {}
+            FROM
+                {}
+            WHERE
+                id = ?
+        """.format(cls._columns, cls._table)
+
+        cls._exists_query = """
+            SELECT
+                COUNT(1)
+            FROM
+                {}
+            WHERE
+                id = ?
+        """.format(cls._table)
+
     @classmethod
     def _build_table_if_necessary(cls):
         if not cls.has_table():
@@ -101,7 +201,10 @@ class Model(abc.ABC):
 
         all_fields = 'id INTEGER PRIMARY KEY ASC AUTOINCREMENT,' + fields
 
-        indexes = ';'.join(cls._get_index_query(i) for i in cls._indexes)
+        indexes = ';'.join(
+            cls._get_index_query(i, unique)
+            for i, unique in cls._get_declared_indexes()
+        )
 
         return query.format(
             table=cls._table,
@@ -137,88 +240,286 @@ class Model(abc.ABC):
         )
 
     @classmethod
-    def _get_index_query(cls, index):
+    def _get_declared_indexes(cls):
+        return [(i, False) for i in cls._indexes] \
+            + [(i, True) for i in cls._unique_indexes]
+
+    @classmethod
+    def _get_index_query(cls, index, unique=False):
         query = """
-            CREATE INDEX {index_name} ON {table} ( {fields} )
+            CREATE {unique} INDEX IF NOT EXISTS {index_name}
+                ON {table} ( {fields} )
         """
 
         if isinstance(index, str):
             index = [index]
 
-        index_name = '{}_{}'.format(cls._table, '_'.join(index))
+        index_name = cls._get_index_name(index, unique)
 
         fields = ','.join(index)
 
         return query.format(
+            unique='UNIQUE' if unique else '',
             index_name=index_name,
             table=cls._table,
             fields=fields,
         )
 
+    @classmethod
+    def _get_index_name(cls, index, unique=False):
+        if isinstance(index, str):
+            index = [index]
+
+        # unique indexes get their own names, so making an existing index
+        # unique creates a new one rather than matching the old one
+        suffix = '_unique' if unique else ''
+
+        return '{}_{}{}'.format(cls._table, '_'.join(index), suffix)
+
+    @classmethod
+    def _get_index_names(cls, table=None):
+        query = """
+            SELECT
+                name
+            FROM
+                sqlite_master
+            WHERE
+                    type = 'index'
+                AND
+                    tbl_name = ?
+                AND
+                    sql IS NOT NULL
+        """
+
+        rows = cls.database.fetch_all(query, table or cls._table)
+        return [row['name'] for row in rows]
+
+    @classmethod
+    def _reconcile_indexes(cls):
+        declared = {
+            cls._get_index_name(i, unique): (i, unique)
+            for i, unique in cls._get_declared_indexes()
+        }
+        existing = set(cls._get_index_names())
+
+        with cls.database.transaction():
+            for name in declared.keys() - existing:
+                logging.info(f'Creating missing index `{name}`')
+                cls.database.execute(cls._get_index_query(*declared[name]))
+
+            for name in existing - declared.keys():
+                if not cls.database.settings.drop_stale_indexes:
+                    logging.info(f'Index `{name}` on `{cls._table}` is not'
+                                 f' declared by {cls.__name__}')
+                    continue
+
+                logging.info(f'Dropping stale index `{name}`')
+                cls.database.execute('DROP INDEX {}'.format(name))
+
     @classmethod
     def _update_table_if_necessary(cls):
         if cls._needs_new_columns():
-            cls._update_table()
+            cls._update_table(rebuild=False)
 
     @classmethod
     def _needs_new_columns(cls):
+        fields = cls._get_table_columns()
+        fields.remove('id')
+
+        return set(fields) != set(cls._fields.keys())
+
+    @classmethod
+    def _get_table_columns(cls, table=None):
         query = """
             pragma table_info('{}')
         """.format(
-            cls._table
+            table or cls._table
         )
 
-        fields = [f['name'] for f in cls.database.fetch_all(query)]
-        fields.remove('id')
+        return [f['name'] for f in cls.database.fetch_all(query)]
 
-        return set(fields) != set(cls._fields.keys())
+    @classmethod
+    def _update_table(cls, rebuild=True):
+        """Brings the table in line with `_fields` and `_indexes`.
+
+            New columns are added in place when possible. Anything else (or
+            `rebuild`) copies the rows into a freshly built table, entirely
+            inside sqlite so the rows never have to be held in memory."""
+
+        if cls._cache:
+            cls._cache.clear()
+
+        columns = cls._get_table_columns()
+        new_fields = [f for f in cls._fields if f not in columns]
+        removed_fields = [f for f in columns if f not in cls._fields]
+        removed_fields.remove('id')
+
+        can_alter = not rebuild and not removed_fields and all(
+            cls._can_add_column(f) for f in new_fields
+        )
+
+        with cls.database.transaction():
+            if can_alter:
+                for field in new_fields:
+                    cls._add_column(field)
+
+            else:
+                cls._copy_table(columns)
+
+            cls._reconcile_indexes()
 
     @classmethod
-    def _update_table(cls):
-        old_data = cls._get_old_data()
+    def _can_add_column(cls, name):
+        # sqlite needs a default to add a NOT NULL column to existing rows
+        field = cls._fields[name]
+        return isinstance(field, Optional) \
+            or not isinstance(field, FieldDefinition)
 
-        cls._delete_table()
-        cls._build_table()
+    @classmethod
+    def _add_column(cls, name):
+        query = """
+            ALTER TABLE {table} ADD COLUMN {field} {default}
+        """
 
-        convert = lambda v: None if isinstance(v, FieldDefinition) else v
+        field = cls._fields[name]
+        default = ''
 
-        for row in old_data:
-            fields = {k: convert(v) for k, v in cls._fields.items()}
-            fields.update(row)
+        if not isinstance(field, FieldDefinition):
+            default = 'DEFAULT ' + cls._get_sql_literal(field)
 
-            cls.database.insert(cls._table, fields)
+        cls.database.execute(query.format(
+            table=cls._table,
+            field=cls._get_field_query(name, field),
+            default=default
+        ))
+
+    @staticmethod
+    def _get_sql_literal(value):
+        if value is None:
+            return 'NULL'
+
+        if isinstance(value, (bool, int, float)):
+            return repr(int(value) if isinstance(value, bool) else value)
+
+        if isinstance(value, str):
+            return "'{}'".format(value.replace("'", "''"))
+
+        return "X'{}'".format(bytes(value).hex())
 
     @classmethod
-    def _get_old_data(cls):
+    def _copy_table(cls, columns):
+        old_table = cls._table + '_old'
+
+        cls.database.execute('ALTER TABLE {} RENAME TO {}'.format(
+            cls._table,
+            old_table
+        ))
+
+        # indexes move with the renamed table and their names would clash
+        # with the ones created for the new table
+        cls._drop_indexes(old_table)
+        cls._build_table()
+
+        kept_fields = ['id'] + [f for f in cls._fields if f in columns]
+        new_fields = [f for f in cls._fields if f not in columns]
+
+        convert = lambda v: None if isinstance(v, FieldDefinition) else v
+        defaults = [convert(cls._fields[f]) for f in new_fields]
+
         query = """
+            INSERT INTO {table} ( {fields} )
             SELECT
-                *
+                {values}
             FROM
-                {}
+                {old_table}
             ORDER BY
                 id ASC
         """.format(
-            cls._table
+            table=cls._table,
+            fields=','.join(kept_fields + new_fields),
+            values=','.join(kept_fields + ['?'] * len(new_fields)),
+            old_table=old_table,
         )
 
-        return cls.database.fetch_all(query)
+        cls.database.execute(query, defaults)
+        cls.database.execute('DROP TABLE {}'.format(old_table))
+
+    @classmethod
+    def _drop_indexes(cls, table):
+        for name in cls._get_index_names(table):
+            cls.database.execute('DROP INDEX {}'.format(name))
 
     @classmethod
-    def _delete_table(cls):
+    def get_list_by(cls, **kwargs):
+        if not kwargs:
+            return cls.get_list()
+
+        query = cls._get_list_by_query(kwargs)
+
+        models = cls._get_cached_list_by(kwargs)
+        if models is not None:
+            return models
+
+        data = cls.database.fetch_all(query, kwargs)
+
+        return cls._load_list_by(kwargs, data)
+
+    @classmethod
+    async def aget_list_by(cls, **kwargs):
+        if not kwargs:
+            return await cls.aget_list()
+
+        query = cls._get_list_by_query(kwargs)
+
+        models = cls._get_cached_list_by(kwargs)
+        if models is not None:
+            return models
+
+        generation = cls._get_cache_generation()
+        data = await cls.database.aio.fetch_all(query, kwargs)
+
+        return cls._load_list_by(kwargs, data, generation)
+
+    @classmethod
+    def _get_cached_list_by(cls, kwargs):
+        if cls._cache:
+            return cls._cache.get_list_by(kwargs)
+
+        return None
+
+    @classmethod
+    def _get_list_by_query(cls, kwargs):
+        key = frozenset(kwargs)
+
+        try:
+            return cls._list_by_queries[key]
+
+        except KeyError:
+            pass
+
+        cls._check_fields(kwargs)
+
         query = """
-            DROP TABLE
+            SELECT
+                {}
+            FROM
+                {}
+            WHERE
                 {}
         """.format(
-            cls._table
+            cls._columns,
+            cls._table,
+            ' AND '.join('{0} = :{0}'.format(name) for name in sorted(key))
         )
 
-        cls.database.execute(query, commit=False)
+        if cls.database.settings.explain_queries:
+            cls._check_query_plan(query, key)
 
-    @classmethod
-    def get_list_by(cls, **kwargs):
-        if not kwargs:
-            return cls.get_list()
+        cls._list_by_queries[key] = query
+        return query
 
+    @classmethod
+    def _check_fields(cls, kwargs):
         all_fields = list(cls._fields) + ['id']
 
         for field in kwargs:
@@ -230,66 +531,233 @@ class Model(abc.ABC):
                     )
                 )
 
+    @classmethod
+    def _check_query_plan(cls, query, columns):
+        parameters = {column: None for column in columns}
+        plan = cls.database.fetch_all('EXPLAIN QUERY PLAN ' + query,
+                                      parameters)
+
+        if any(row['detail'].startswith('SCAN') for row in plan):
+            logging.warning(
+                '{}.get_by({}) scans the whole `{}` table, consider adding'
+                ' an index for it to `_indexes`'.format(
+                    cls.__name__,
+                    ', '.join(sorted(columns)),
+                    cls._table
+                )
+            )
+
+    @classmethod
+    def _get_cache_generation(cls):
+        return cls._cache.generation if cls._cache else None
+
+    @classmethod
+    def _load_list_by(cls, kwargs, data, generation=None):
+        models = cls._load_all(data, generation)
+
+        if cls._cache and not cls._is_stale(generation):
+            cls._cache.store_list_by(kwargs, models)
+
+        return models
+
+    @classmethod
+    def _is_stale(cls, generation):
+        return generation is not None \
+            and generation != cls._cache.generation
+
+    @classmethod
+    def _load_all(cls, data, generation=None):
+        """Loads query rows, checking the cache didn't change while an async
+            query started at `generation` was running.
+
+            Rows read across a change may be out of date, so they are returned
+            but not cached."""
+
+        if cls._cache and cls._is_stale(generation):
+            return [
+                cls._cache.peek(row[0]) or cls._build_from_row(row)
+                for row in data
+            ]
+
+        return [cls._load(fields) for fields in data]
+
+    @classmethod
+    def _load(cls, row):
+        if cls._cache:
+            return cls._cache.load(row, cls._build_from_row)
+
+        return cls._build_from_row(row)
+
+    @classmethod
+    def get_list(cls, order_by='id ASC', limit=None, offset=None):
+        query = cls._get_list_query(order_by)
+        parameters = cls._get_limit_parameters(limit, offset)
+
+        data = cls.database.fetch_all(query, parameters)
+
+        return [cls._load(fields) for fields in data]
+
+    @classmethod
+    async def aget_list(cls, order_by='id ASC', limit=None, offset=None):
+        query = cls._get_list_query(order_by)
+        parameters = cls._get_limit_parameters(limit, offset)
+
+        generation = cls._get_cache_generation()
+        data = await cls.database.aio.fetch_all(query, parameters)
+
+        return cls._load_all(data, generation)
+
+    @classmethod
+    def iter_list(cls, order_by='id ASC', limit=None, offset=None,
+                  batch_size=None):
+        """Like `get_list`, but only holds `batch_size` rows at a time.
+
+            The query's cursor stays open until the generator is exhausted,
+            so prefer `iter_by` or `aiter_pages_by` when the caller awaits
+            between models."""
+
+        query = cls._get_list_query(order_by)
+        parameters = cls._get_limit_parameters(limit, offset)
+
+        rows = cls.database.iter_all(query, parameters, batch_size)
+
+        for row in rows:
+            yield cls._load(row)
+
+    @staticmethod
+    def _get_limit_parameters(limit, offset):
+        # sqlite treats a negative limit as no limit at all
+        return (-1 if limit is None else limit, offset or 0)
+
+    @classmethod
+    def _get_list_query(cls, order_by):
+        try:
+            return cls._list_queries[order_by]
+
+        except KeyError:
+            pass
+
         query = """
             SELECT
-                *
+                {}
             FROM
                 {}
-            WHERE
+            ORDER BY
                 {}
-        """.format(
-            cls._table,
-            ' AND '.join('{0} = :{0}'.format(name) for name in kwargs)
-        )
-        data = cls.database.fetch_all(query, kwargs)
+            LIMIT ? OFFSET ?
+        """.format(cls._columns, cls._table, order_by)
+
+        cls._list_queries[order_by] = query
+        return query
+
+    @classmethod
+    def get_page_by(cls, after_id=0, limit=None, **kwargs):
+        """Returns up to `limit` models with an id above `after_id`.
+
+            Passing the last id of one page as `after_id` gets the next, which
+            stays fast however deep into the table the pages go."""
+
+        query = cls._get_page_query(kwargs)
+        parameters = cls._get_page_parameters(after_id, limit, kwargs)
+
+        data = cls.database.fetch_all(query, parameters)
+
+        return [cls._load(fields) for fields in data]
+
+    @classmethod
+    async def aget_page_by(cls, after_id=0, limit=None, **kwargs):
+        query = cls._get_page_query(kwargs)
+        parameters = cls._get_page_parameters(after_id, limit, kwargs)
 
-        return [cls._build_from_fields(fields) for fields in data]
+        generation = cls._get_cache_generation()
+        data = await cls.database.aio.fetch_all(query, parameters)
+
+        return cls._load_all(data, generation)
 
     @classmethod
-    def _build_from_fields(cls, fields):
-        fields = dict(fields)
+    def iter_by(cls, batch_size=None, **kwargs):
+        after_id = 0
+
+        while True:
+            models = cls.get_page_by(after_id, batch_size, **kwargs)
+            yield from models
 
-        model = cls()
-        model._id = fields.pop('id')
-        for field in model.fields:
-            value = fields.pop(field)
+            if len(models) < (batch_size or cls.database.batch_size):
+                return
 
-            if type(getattr(model, field)) is bool:
-                value = bool(value)
+            after_id = models[-1].id
 
-            setattr(model, field, value)
+    @classmethod
+    async def aiter_pages_by(cls, batch_size=None, **kwargs):
+        after_id = 0
 
-        if fields:
-            logging.warning('{} has extra fields in the database: {!r}'.format(
-                cls.__name__,
-                fields
-            ))
+        while True:
+            models = await cls.aget_page_by(after_id, batch_size, **kwargs)
+            if models:
+                yield models
 
-        return model
+            if len(models) < (batch_size or cls.database.batch_size):
+                return
+
+            after_id = models[-1].id
 
     @classmethod
-    def get_list(cls, order_by='id ASC', limit=None):
+    def _get_page_query(cls, kwargs):
+        key = frozenset(kwargs)
+
+        try:
+            return cls._page_queries[key]
+
+        except KeyError:
+            pass
+
+        cls._check_fields(kwargs)
+
+        where = ['id > :_after_id'] + [
+            '{0} = :{0}'.format(name) for name in sorted(key)
+        ]
+
         query = """
             SELECT
-                *
+                {}
             FROM
                 {}
-            ORDER BY
+            WHERE
                 {}
-        """.format(cls._table, order_by)
+            ORDER BY
+                id ASC
+            LIMIT :_limit
+        """.format(
+            cls._columns,
+            cls._table,
+            ' AND '.join(where)
+        )
 
-        if limit is not None:
-            query += 'LIMIT {}'.format(limit)
+        cls._page_queries[key] = query
+        return query
 
-        data = cls.database.fetch_all(query)
+    @classmethod
+    def _get_page_parameters(cls, after_id, limit, kwargs):
+        parameters = dict(kwargs)
+        parameters['_after_id'] = after_id
+        parameters['_limit'] = limit or cls.database.batch_size
 
-        return [cls._build_from_fields(fields) for fields in data]
+        return parameters
 
     @classmethod
     def get_by(cls, **kwargs):
         models = cls.get_list_by(**kwargs)
         return models[0] if models else None
 
+    @classmethod
+    async def aget_by(cls, **kwargs):
+        models = await cls.aget_list_by(**kwargs)
+        return models[0] if models else None
+
+    @classmethod
+    def get_cached(cls, model_id):
+        return cls._cache.peek(model_id) if cls._cache else None
+
     @property
     def id(self):
         return self._id
@@ -305,37 +773,98 @@ class Model(abc.ABC):
     def save(self):
         fields = {field: getattr(self, field) for field in self.fields}
 
-        if self.id is None:
-            self._id = self.database.insert(self.table, fields)
+        try:
+            if self.id is None:
+                self._id = self.database.insert(self.table, fields)
+
+            else:
+                self.database.update(self.table, fields, id=self.id)
+
+        except Exception:
+            self._save_failed()
+            raise
 
-        else:
-            self.database.update(self.table, fields, id=self.id)
+        if self._cache:
+            self._saved(self.database.fetch_row(self._row_query, self.id))
+
+    async def asave(self):
+        fields = {field: getattr(self, field) for field in self.fields}
+
+        try:
+            if self.id is None:
+                self._id = await self.database.aio.insert(self.table, fields)
+
+            else:
+                await self.database.aio.update(self.table, fields, id=self.id)
+
+        except Exception:
+            self._save_failed()
+            raise
+
+        # the model may have been deleted while the query was running
+        if self._cache and self.id is not None:
+            row = await self.database.aio.fetch_row(self._row_query, self.id)
+            self._saved(row)
+
+    def _save_failed(self):
+        # the instance holds values the database turned down, so it can't be
+        # handed out from the cache anymore
+        if self._cache and self.id is not None:
+            self._cache.evict(self)
+
+    def _saved(self, row):
+        """Updates the cache with the row as the database stored it.
+
+            The fields are read back first, so values set with the wrong type
+            (e.g. strings from a command) don't linger in the cache."""
+
+        if row is None:
+            return
+
+        stored = self._build_from_row(row)
+        for field in self.fields:
+            setattr(self, field, getattr(stored, field))
+
+        self._cache.saved(self)
+        self.database.model_changed(type(self))
 
     def delete(self):
         if not self.id:
             return
 
-        query = """
-            DELETE FROM
-                {}
-            WHERE
-                id = ?
-        """.format(self.table)
+        self.database.execute(self._delete_query, self.id)
+        self._deleted()
+
+    async def adelete(self):
+        if not self.id:
+            return
+
+        await self.database.aio.execute(self._delete_query, self.id)
+        self._deleted()
+
+    def _deleted(self):
+        if self._cache:
+            self._cache.deleted(self)
+            self.database.model_changed(type(self))
 
-        self.database.execute(query, self.id)
         self._id = None
 
     def exists(self):
         if not self.id:
             return False
 
-        query = """
-            SELECT
-                COUNT(1)
-            FROM
-                {}
-            WHERE
-                id = ?
-        """.format(self.table)
+        if self._cache and self._cache.peek(self.id) is self:
+            return True
 
+        query = self._exists_query
         return int(self.database.fetch_value(query, self.id)) > 0
+
+    async def aexists(self):
+        if not self.id:
+            return False
+
+        if self._cache and self._cache.peek(self.id) is self:
+            return True
+
+        query = self._exists_query
+        return int(await self.database.aio.fetch_value(query, self.id)) > 0
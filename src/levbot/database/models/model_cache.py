@@ -0,0 +1,173 @@
+from collections import OrderedDict
+
+
+class ModelCache:
+    def __init__(self, model_class, max_size):
+        self.model_class = model_class
+        self.max_size = max_size
+
+        self._models = OrderedDict()  # id -> model instance
+        self._queries = OrderedDict()  # (columns, values) -> tuple of ids
+        self._keys = {}  # id -> query keys the model was last stored under
+
+        self._lookups = self._get_lookups(model_class)
+
+        # bumped on every change, so queries that ran across one can tell
+        # their rows might be stale
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return (
+            '{name} cache: {size}/{max_size} models, {queries} queries,'
+            ' {hits} hits, {misses} misses, {evictions} evictions'
+        ).format(
+            name=self.model_class.__name__,
+            size=len(self._models),
+            max_size=self.max_size,
+            queries=len(self._queries),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+    @staticmethod
+    def _get_lookups(model_class):
+        lookups = []
+
+        for index in model_class._indexes + model_class._unique_indexes:
+            if isinstance(index, str):
+                index = [index]
+
+            lookups.append(tuple(sorted(index)))
+
+        return lookups
+
+    def clear(self):
+        self.generation += 1
+        self._models.clear()
+        self._queries.clear()
+        self._keys.clear()
+
+    def peek(self, model_id):
+        return self._models.get(model_id)
+
+    def get_list_by(self, kwargs):
+        if len(kwargs) == 1 and 'id' in kwargs:
+            model = self._models.get(kwargs['id'])
+            if model is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._models.move_to_end(model.id)
+            return [model]
+
+        key = self._get_query_key(kwargs)
+        if key is None:
+            return None
+
+        ids = self._queries.get(key)
+        if ids is None:
+            self.misses += 1
+            return None
+
+        models = [self._models.get(model_id) for model_id in ids]
+        if None in models:
+            # one of the results was evicted, the query has to run again
+            del self._queries[key]
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._queries.move_to_end(key)
+        for model in models:
+            self._models.move_to_end(model.id)
+
+        return models
+
+    def store_list_by(self, kwargs, models):
+        key = self._get_query_key(kwargs)
+        if key is None:
+            return
+
+        self._queries[key] = tuple(model.id for model in models)
+        self._queries.move_to_end(key)
+
+        while len(self._queries) > self.max_size:
+            self._queries.popitem(last=False)
+
+    def load(self, row, build):
+        """Returns the cached instance for a row, building it if needed"""
+
+        model = self._models.get(row[0])
+        if model is not None:
+            self._models.move_to_end(model.id)
+            return model
+
+        model = build(row)
+        self._add(model)
+        return model
+
+    def saved(self, model):
+        self.generation += 1
+        self._invalidate_queries(model)
+        self._add(model)
+
+    def deleted(self, model):
+        self.evict(model)
+
+    def evict(self, model):
+        self.generation += 1
+        self._invalidate_queries(model)
+        self._models.pop(model.id, None)
+        self._keys.pop(model.id, None)
+
+    def _add(self, model):
+        self._models[model.id] = model
+        self._models.move_to_end(model.id)
+        self._keys[model.id] = self._get_model_keys(model)
+
+        while len(self._models) > self.max_size:
+            model_id, _ = self._models.popitem(last=False)
+            self.evictions += 1
+
+            # without its keys, the evicted model's queries could no longer
+            # be invalidated when it changes
+            for key in self._keys.pop(model_id, ()):
+                self._queries.pop(key, None)
+
+    def _invalidate_queries(self, model):
+        # drop cached results the model was part of before this change, and
+        # any results it would become part of afterwards (including cached
+        # empty results)
+        keys = self._keys.get(model.id, ()) + self._get_model_keys(model)
+
+        for key in keys:
+            self._queries.pop(key, None)
+
+    def _get_model_keys(self, model):
+        return tuple(
+            (columns, tuple(getattr(model, column) for column in columns))
+            for columns in self._lookups
+        )
+
+    def _get_query_key(self, kwargs):
+        columns = tuple(sorted(kwargs))
+        if columns not in self._lookups:
+            return None
+
+        # values of the wrong type (e.g. strings typed into a command) are
+        # stored differently by sqlite and would never be invalidated
+        for column in columns:
+            if type(kwargs[column]) is not self._get_field_type(column):
+                return None
+
+        return columns, tuple(kwargs[column] for column in columns)
+
+    def _get_field_type(self, column):
+        field = self.model_class._fields[column]
+        return getattr(field, 'type', type(field))
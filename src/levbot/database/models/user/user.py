@@ -2,10 +2,12 @@ import discord
 
 from discord.utils import cached_slot_property
 from ..model import Model, Required
-from ....user_level import UserLevel
+from ....user_level import UserLevel, forget_user
 
 
 class User(Model):
+    __slots__ = ('_user', '_user_guilds')
+
     _table = 'users'
 
     _fields = {
@@ -16,6 +18,8 @@ class User(Model):
 
     _indexes = ['user_did']
 
+    _cache_size = 1000
+
     @cached_slot_property('_user_guilds')
     def user_guilds(self):
         return self.database.UserGuild.get_list_by(user_id=self.id)
@@ -51,14 +55,40 @@ class User(Model):
         return UserLevel.get(discord.Object(self.user_did), channel)
 
     def save(self):
-        super().save()
+        old_user_did = self._get_saved_user_did()
+
+        with self.database.transaction():
+            super().save()
+
+            for guild in self.user_guilds:
+                guild.user_id = self.id
+                guild.save()
 
-        for guild in self.user_guilds:
-            guild.user_id = self.id
-            guild.save()
+        # levels cached under the previous id would otherwise outlive it
+        forget_user(self.user_did)
+        if old_user_did not in (None, self.user_did):
+            forget_user(old_user_did)
+
+    def _get_saved_user_did(self):
+        if self.id is None:
+            return None
+
+        query = """
+            SELECT
+                user_did
+            FROM
+                users
+            WHERE
+                id = ?
+        """
+
+        return self.database.fetch_value(query, self.id)
 
     def delete(self):
-        for guild in self.user_guilds:
-            guild.delete()
+        with self.database.transaction():
+            for guild in self.user_guilds:
+                guild.delete()
+
+            super().delete()
 
-        super().delete()
+        forget_user(self.user_did)
@@ -1,9 +1,12 @@
 from discord.utils import cached_slot_property
 from discord import NotFound, Forbidden
 from ..model import Model, Required
+from ....user_level import forget_user
 
 
 class UserGuild(Model):
+    __slots__ = ('_user', '_guild')
+
     _table = 'user_guilds'
 
     _fields = {
@@ -36,3 +39,27 @@ class UserGuild(Model):
 
         except (NotFound, Forbidden):
             return None
+
+    def save(self):
+        super().save()
+        self._forget_user_guilds()
+        self._forget_user_level()
+
+    def delete(self):
+        super().delete()
+        self._forget_user_guilds()
+        self._forget_user_level()
+
+    def _forget_user_guilds(self):
+        # cached users hold on to their guild list, so it has to be refreshed
+        user = self.database.User.get_cached(self.user_id)
+
+        try:
+            del user._user_guilds
+
+        except AttributeError:
+            pass
+
+    def _forget_user_level(self):
+        if self.user:
+            forget_user(self.user.user_did)
@@ -0,0 +1,177 @@
+import json
+import time
+import logging
+
+from collections import defaultdict
+from collections.abc import Coroutine
+
+
+class HandlerProfile:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+        self.wall_time = 0.0
+        self.max_wall_time = 0.0
+        self.blocking_time = 0.0
+        self.max_blocking_step = 0.0
+
+    def as_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'wall_time': self.wall_time,
+            'max_wall_time': self.max_wall_time,
+            'blocking_time': self.blocking_time,
+            'max_blocking_step': self.max_blocking_step,
+        }
+
+
+class TimedCoroutine(Coroutine):
+    """Runs a coroutine, timing each step it runs on the event loop.
+
+        The time spent inside `send` and `throw` is time the loop couldn't
+        do anything else, which is what the blocking time adds up."""
+
+    def __init__(self, coro, profile):
+        self.coro = coro
+        self.profile = profile
+
+        self._steps = None
+
+    def send(self, value):
+        return self._get_steps().send(value)
+
+    def throw(self, *args):
+        if self._steps is None:
+            # e.g. cancelled before its first step, which never reaches the
+            # wrapped coroutine
+            self.coro.close()
+
+        return self._get_steps().throw(*args)
+
+    def close(self):
+        if self._steps is None:
+            # dropped before it started, the wrapped coroutine still has to
+            # be closed or it warns it was never awaited
+            self.coro.close()
+
+        else:
+            self._steps.close()
+
+    def _get_steps(self):
+        if self._steps is None:
+            self._steps = self.__await__()
+
+        return self._steps
+
+    def __await__(self):
+        profile = self.profile
+        profile.calls += 1
+        profile.in_flight += 1
+        profile.peak_in_flight = max(profile.peak_in_flight,
+                                     profile.in_flight)
+
+        start = time.perf_counter()
+        value = None
+        error = None
+
+        try:
+            while True:
+                step_start = time.perf_counter()
+
+                try:
+                    if error is None:
+                        yielded = self.coro.send(value)
+                    else:
+                        yielded = self.coro.throw(error)
+
+                except StopIteration as ex:
+                    return ex.value
+
+                finally:
+                    self._add_step(time.perf_counter() - step_start)
+
+                try:
+                    value = yield yielded
+                    error = None
+
+                except GeneratorExit:
+                    self.coro.close()
+                    raise
+
+                except BaseException as ex:
+                    value = None
+                    error = ex
+
+        except Exception:
+            profile.errors += 1
+            raise
+
+        finally:
+            wall_time = time.perf_counter() - start
+
+            profile.in_flight -= 1
+            profile.wall_time += wall_time
+            profile.max_wall_time = max(profile.max_wall_time, wall_time)
+
+    def _add_step(self, duration):
+        self.profile.blocking_time += duration
+        self.profile.max_blocking_step = max(self.profile.max_blocking_step,
+                                             duration)
+
+
+class EventProfiler:
+    """Times event handlers, per event and handler.
+
+        Off by default, it can be switched on in the settings or from the
+        console with `bot.profiler.enabled = True`. `report()` returns a
+        table of the results and `dump()` writes them to a JSON file."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.enabled = settings.enabled
+
+        self.profiles = defaultdict(HandlerProfile)
+
+    def wrap(self, event, handler, coro):
+        name = '{}.{}'.format(handler.__module__, handler.__qualname__)
+        return TimedCoroutine(coro, self.profiles[event, name])
+
+    def clear(self):
+        self.profiles.clear()
+
+    def report(self, sort_by='blocking_time'):
+        lines = ['{:<20} {:<44} {:>7} {:>6} {:>10} {:>10} {:>9}'.format(
+            'event', 'handler', 'calls', 'flight', 'wall', 'blocking',
+            'max step'
+        )]
+
+        profiles = sorted(self.profiles.items(),
+                          key=lambda item: -getattr(item[1], sort_by))
+
+        for (event, name), profile in profiles:
+            lines.append(
+                '{:<20} {:<44} {:>7} {:>6} {:>9.2f}s {:>9.3f}s {:>7.1f}ms'
+                .format(event[:20], name[-44:], profile.calls,
+                        profile.in_flight, profile.wall_time,
+                        profile.blocking_time,
+                        profile.max_blocking_step * 1000)
+            )
+
+        return '\n'.join(lines)
+
+    def dump(self, filename=None):
+        filename = filename or self.settings.dump_file
+
+        with open(filename, 'w') as f:
+            json.dump([
+                dict(event=event, handler=name, **profile.as_dict())
+                for (event, name), profile in self.profiles.items()
+            ], f, indent=2)
+
+        logging.info(f'Event profile written to {filename}')
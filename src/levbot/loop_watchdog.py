@@ -0,0 +1,101 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+from collections import Counter
+
+
+class LoopWatchdog:
+    """Reports what the event loop was doing when it stops responding.
+
+        A task on the loop records a heartbeat, while a separate thread
+        checks on it. When the heartbeat is late by more than the threshold
+        the thread grabs the loop thread's current stack, logs it and counts
+        the stall against the line that was running."""
+
+    def __init__(self, bot, settings):
+        self.bot = bot
+        self.settings = settings
+
+        self.stalls = Counter()  # (filename, line number, function) -> count
+        self.longest_stall = 0.0
+
+        # stalls are counted on the watchdog thread and read on the loop
+        self._stalls_lock = threading.Lock()
+
+        self._last_beat = time.monotonic()
+        self._loop_thread_id = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+        if settings.enabled:
+            self.bot.loop.create_task(self.heartbeat_loop())
+
+    @property
+    def threshold(self):
+        return self.settings.stall_threshold / 1000
+
+    async def heartbeat_loop(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+
+        self._thread = threading.Thread(target=self._watch,
+                                        name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+        while not self.bot.is_closed():
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.threshold / 2)
+
+        self.stop()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _watch(self):
+        reported_beat = None
+
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._last_beat
+            lag = time.monotonic() - beat
+
+            if lag < self.threshold:
+                continue
+
+            self.longest_stall = max(self.longest_stall, lag)
+
+            # only report each stall once, when it crosses the threshold
+            if beat == reported_beat:
+                continue
+
+            reported_beat = beat
+            self._report_stall(lag)
+
+    def _report_stall(self, lag):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+
+        stack = traceback.extract_stack(frame)[-self.settings.stack_depth:]
+        del frame
+
+        site = stack[-1]
+
+        with self._stalls_lock:
+            self.stalls[site.filename, site.lineno, site.name] += 1
+
+        logging.warning(
+            'Event loop blocked for over {:.0f}ms in:\n{}'.format(
+                lag * 1000, ''.join(traceback.format_list(stack)).rstrip()
+            )
+        )
+
+    def get_report_lines(self, count=10):
+        with self._stalls_lock:
+            most_common = self.stalls.most_common(count)
+
+        for (filename, lineno, name), stalls in most_common:
+            yield '{:>5}x {}:{} in {}'.format(stalls, filename, lineno, name)
@@ -0,0 +1,59 @@
+import re
+
+from discord.abc import PrivateChannel
+
+
+class MessageClassifier:
+    """Tags incoming messages so on_message handlers only run when needed.
+
+        Every pattern is folded into a single regex that is run once per
+        message. Patterns may be given as callables taking the bot, for
+        patterns that aren't known until the bot has logged in."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+        self._patterns = {}
+        self._regex = None
+
+    def add_pattern(self, name, pattern):
+        if not name.isidentifier():
+            raise ValueError(f'Invalid message class name "{name}"')
+
+        self._patterns[name] = pattern
+        self._regex = None
+
+    def classify(self, message):
+        classes = set()
+
+        if isinstance(message.channel, PrivateChannel):
+            classes.add('private')
+
+        regex = self._get_regex()
+        if regex:
+            for match in regex.finditer(message.content):
+                classes.add(match.lastgroup)
+
+        return classes
+
+    def _get_regex(self):
+        if self._regex is None and self._patterns:
+            self._regex = re.compile('|'.join(
+                '(?P<{}>{})'.format(name, self._get_pattern(pattern))
+                for name, pattern in self._patterns.items()
+            ))
+
+        return self._regex
+
+    def _get_pattern(self, pattern):
+        if callable(pattern):
+            pattern = pattern(self.bot)
+
+        if isinstance(pattern, re.Pattern):
+            flags = 'i' if pattern.flags & re.IGNORECASE else ''
+            pattern = pattern.pattern
+
+            if flags:
+                pattern = '(?{}:{})'.format(flags, pattern)
+
+        return pattern
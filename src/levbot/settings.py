@@ -151,6 +151,61 @@ class BotMessageSplittingCategory(Category):
     space_search_len = 100
 
 
+class BotDatabaseCategory(Category):
+    journal_mode = 'WAL'
+    synchronous = 'NORMAL'
+    cache_size = -16000  # negative values are in KiB
+    mmap_size = 268435456  # bytes
+    busy_timeout = 5000  # milliseconds
+    temp_store = 'MEMORY'
+    cached_statements = 256
+    read_connections = 4
+    batch_size = 500
+    auto_vacuum = 'INCREMENTAL'
+    maintenance_interval = 60  # minutes
+    vacuum_pages = 0  # 0 frees every unused page
+    analyze_interval = 1440  # minutes
+    drop_stale_indexes = False
+    explain_queries = True
+
+
+class BotCommandsCategory(Category):
+    slow_threshold = 2000  # milliseconds, 0 disables
+    stats_log_interval = 60  # minutes, 0 disables
+
+
+class BotTasksCategory(Category):
+    max_running = 100  # per event
+    max_queued = 1000  # per event, handlers past this are dropped
+    close_timeout = 10  # seconds
+
+
+class BotProfilerCategory(Category):
+    enabled = False
+    dump_file = 'event_profile.json'  # written on shutdown when enabled
+
+
+class BotWatchdogCategory(Category):
+    enabled = False
+    stall_threshold = 250  # milliseconds
+    stack_depth = 5  # frames logged for each stall
+
+
+class BotUserLevelsCategory(Category):
+    cache_ttl = 300  # seconds, 0 disables the cache
+    cache_size = 10000
+
+
+class BotHttpCategory(Category):
+    connection_limit = 100
+    connection_limit_per_host = 10
+    dns_cache_ttl = 300  # seconds
+    keepalive_timeout = 30  # seconds
+    total_timeout = 0  # seconds, 0 disables
+    connect_timeout = 10  # seconds, 0 disables
+    read_timeout = 30  # seconds, 0 disables
+
+
 class BotCategory(Category):
     # values
     token = Required(str)
@@ -164,6 +219,13 @@ class BotCategory(Category):
     logs = BotLogsCategory()
     avatar = BotAvatarCategory()
     message_splitting = BotMessageSplittingCategory()
+    database = BotDatabaseCategory()
+    commands = BotCommandsCategory()
+    tasks = BotTasksCategory()
+    profiler = BotProfilerCategory()
+    watchdog = BotWatchdogCategory()
+    user_levels = BotUserLevelsCategory()
+    http = BotHttpCategory()
 
 
 class SettingsError(Exception):
@@ -0,0 +1,127 @@
+import time
+import asyncio
+import logging
+
+from collections import defaultdict, deque
+from functools import partial
+
+
+class EventTasks:
+    def __init__(self):
+        self.running = set()
+        self.queue = deque()
+
+        self.started = 0
+        self.errors = 0
+        self.dropped = 0
+        self.peak_queued = 0
+
+        self.last_drop_log = 0
+
+
+class TaskSupervisor:
+    """Runs event handler coroutines as tracked tasks.
+
+        Each event gets at most `max_running` tasks at once. Further
+        handlers wait in a queue of up to `max_queued`, and anything beyond
+        that is dropped."""
+
+    drop_log_interval = 60  # seconds
+
+    def __init__(self, loop, settings):
+        self.loop = loop
+        self.settings = settings
+
+        self.events = defaultdict(EventTasks)
+        self.closing = False
+
+    def spawn(self, event, coro):
+        """Starts, queues or drops a coroutine handling an event"""
+
+        tasks = self.events[event]
+
+        if self.closing:
+            coro.close()
+            return None
+
+        if len(tasks.running) < self.settings.max_running:
+            return self._start(event, tasks, coro)
+
+        if len(tasks.queue) < self.settings.max_queued:
+            tasks.queue.append(coro)
+            tasks.peak_queued = max(tasks.peak_queued, len(tasks.queue))
+            return None
+
+        coro.close()
+        tasks.dropped += 1
+        self._log_drop(event, tasks)
+        return None
+
+    def _start(self, event, tasks, coro):
+        task = self.loop.create_task(coro)
+        task.add_done_callback(partial(self._done, event, tasks))
+
+        tasks.running.add(task)
+        tasks.started += 1
+
+        return task
+
+    def _done(self, event, tasks, task):
+        tasks.running.discard(task)
+
+        if not task.cancelled() and task.exception():
+            tasks.errors += 1
+            logging.error(f'Error in {event} handler',
+                          exc_info=task.exception())
+
+        if tasks.queue and not self.closing:
+            self._start(event, tasks, tasks.queue.popleft())
+
+    def _log_drop(self, event, tasks):
+        now = time.monotonic()
+
+        if now - tasks.last_drop_log >= self.drop_log_interval:
+            tasks.last_drop_log = now
+            logging.warning(
+                f'Too many {event} handlers waiting, dropped {tasks.dropped}'
+                f' so far'
+            )
+
+    def get_report_lines(self):
+        yield '{:<24} {:>8} {:>7} {:>7} {:>9} {:>7} {:>7}'.format(
+            'event', 'started', 'running', 'queued', 'peak', 'dropped',
+            'errors'
+        )
+
+        for event, tasks in sorted(self.events.items()):
+            yield '{:<24} {:>8} {:>7} {:>7} {:>9} {:>7} {:>7}'.format(
+                event[:24], tasks.started, len(tasks.running),
+                len(tasks.queue), tasks.peak_queued, tasks.dropped,
+                tasks.errors
+            )
+
+    async def close(self):
+        """Drops queued handlers and cancels running ones"""
+
+        self.closing = True
+        current = asyncio.current_task()
+        running = []
+
+        for tasks in self.events.values():
+            while tasks.queue:
+                tasks.queue.popleft().close()
+
+            running += [task for task in tasks.running if task is not current]
+
+        for task in running:
+            task.cancel()
+
+        if running:
+            done, pending = await asyncio.wait(
+                running, timeout=self.settings.close_timeout
+            )
+
+            if pending:
+                logging.warning(
+                    f'{len(pending)} event handlers did not finish cancelling'
+                )
@@ -1,5 +1,7 @@
+import time
 import discord
 
+from collections import OrderedDict, defaultdict
 from discord import DMChannel
 from discord.abc import PrivateChannel
 from .ordered_enum import OrderedEnum
@@ -7,6 +9,166 @@ from .ordered_enum import OrderedEnum
 
 owner_usernames = []
 database = None
+cache = None
+overwrite_index = None
+
+
+def forget_user(user_did):
+    """Drops cached levels for a user after their database entry changed"""
+
+    if cache:
+        cache.forget_user(user_did)
+
+
+class UserLevelCache:
+    """Remembers computed user levels for a while.
+
+        Levels are dropped after `cache_ttl` seconds, or earlier when the
+        bot sees a change that could affect them."""
+
+    def __init__(self, bot, settings):
+        self.settings = settings
+
+        # (user id, scope, target id) -> level, expiry
+        self._levels = OrderedDict()
+        self._user_keys = defaultdict(set)
+
+        self.hits = 0
+        self.misses = 0
+
+        bot.register_event('on_member_join', self.on_member_join)
+        bot.register_event('on_member_update', self.on_member_update)
+        bot.register_event('on_member_remove', self.on_member_remove)
+        bot.register_event('on_guild_role_update', self.on_guild_change)
+        bot.register_event('on_guild_role_delete', self.on_guild_change)
+        bot.register_event('on_guild_channel_create', self.on_guild_change)
+        bot.register_event('on_guild_channel_update', self.on_guild_change)
+        bot.register_event('on_guild_channel_delete', self.on_guild_change)
+        bot.register_event('on_guild_update', self.on_guild_change)
+
+    def get(self, key):
+        try:
+            level, expiry = self._levels[key]
+
+        except KeyError:
+            self.misses += 1
+            return None
+
+        if expiry < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._levels.move_to_end(key)
+        self.hits += 1
+        return level
+
+    def store(self, key, level):
+        self._levels[key] = (level, time.monotonic() + self.settings.cache_ttl)
+        self._levels.move_to_end(key)
+        self._user_keys[key[0]].add(key)
+
+        while len(self._levels) > self.settings.cache_size:
+            self._remove(next(iter(self._levels)))
+
+    def _remove(self, key):
+        del self._levels[key]
+
+        keys = self._user_keys[key[0]]
+        keys.discard(key)
+
+        if not keys:
+            del self._user_keys[key[0]]
+
+    def forget_user(self, user_id):
+        for key in self._user_keys.pop(user_id, ()):
+            del self._levels[key]
+
+    def clear(self):
+        self._levels.clear()
+        self._user_keys.clear()
+
+    async def on_member_join(self, member):
+        # a level cached while they weren't a member no longer applies
+        self.forget_user(member.id)
+
+    async def on_member_update(self, before, after):
+        self.forget_user(after.id)
+
+    async def on_member_remove(self, member):
+        self.forget_user(member.id)
+
+    async def on_guild_change(self, *args):
+        # role, channel and ownership changes can affect everyone's level
+        self.clear()
+
+
+class GuildOverwrites:
+    """Sorts a guild's channels by how their overwrites can change whether
+        a member can manage them.
+
+        Being able to manage a channel takes both `manage_channels` and
+        `view_channel`, and voice channels also need `connect`. Channels
+        whose overwrites touch none of these simply follow the member's
+        guild-wide permissions."""
+
+    def __init__(self, guild):
+        self.plain = False  # any other channel without relevant overwrites
+        self.plain_voice = False  # any voice channel without them
+        self.touching = []  # channels with overwrites for these permissions
+        self.allowing = []  # channels with overwrites allowing manage_channels
+
+        for channel in guild.channels:
+            voice = isinstance(channel, discord.abc.Connectable)
+            touches = False
+            allows = False
+
+            for overwrite in channel.overwrites.values():
+                allow, deny = overwrite.pair()
+
+                if allow.manage_channels:
+                    allows = True
+
+                if allow.manage_channels or deny.manage_channels \
+                   or allow.view_channel or deny.view_channel \
+                   or voice and (allow.connect or deny.connect):
+                    touches = True
+
+            if touches:
+                self.touching.append(channel)
+            elif voice:
+                self.plain_voice = True
+            else:
+                self.plain = True
+
+            if allows:
+                self.allowing.append(channel)
+
+
+class ChannelOverwriteIndex:
+    """Keeps GuildOverwrites for each guild until its channels change"""
+
+    def __init__(self, bot):
+        self._guilds = {}
+
+        bot.register_event('on_guild_channel_create', self.on_channel_change)
+        bot.register_event('on_guild_channel_update', self.on_channel_change)
+        bot.register_event('on_guild_channel_delete', self.on_channel_change)
+        bot.register_event('on_guild_remove', self.on_guild_remove)
+
+    def get(self, guild):
+        try:
+            return self._guilds[guild.id]
+
+        except KeyError:
+            overwrites = self._guilds[guild.id] = GuildOverwrites(guild)
+            return overwrites
+
+    async def on_channel_change(self, channel, *args):
+        self._guilds.pop(channel.guild.id, None)
+
+    async def on_guild_remove(self, guild):
+        self._guilds.pop(guild.id, None)
 
 
 class UserLevel(OrderedEnum):
@@ -26,6 +188,26 @@ class UserLevel(OrderedEnum):
 
     @classmethod
     def get(cls, user, channel_or_guild):
+        if not cache:
+            return cls._get(user, channel_or_guild)
+
+        # guild-wide levels are the best over all channels, and a channel
+        # can share its guild's id, so the scope is part of the key
+        if isinstance(channel_or_guild, discord.Guild):
+            key = (user.id, 'guild', channel_or_guild.id)
+        else:
+            key = (user.id, 'channel', getattr(channel_or_guild, 'id', None))
+
+        level = cache.get(key)
+
+        if level is None:
+            level = cls._get(user, channel_or_guild)
+            cache.store(key, level)
+
+        return level
+
+    @classmethod
+    def _get(cls, user, channel_or_guild):
         if str(user) in owner_usernames:
             return cls.bot_owner
 
@@ -42,7 +224,7 @@ class UserLevel(OrderedEnum):
 
         if isinstance(channel_or_guild, discord.Guild):
             guild = channel_or_guild
-            return _get_max_userlevel(user, guild, db_user)
+            return cls._get_max_userlevel(user, guild, db_user)
 
         channel = channel_or_guild
 
@@ -53,14 +235,62 @@ class UserLevel(OrderedEnum):
 
     @classmethod
     def _get_max_userlevel(cls, user, guild, db_user):
-        max_userlevel = cls.blacklisted
+        """Returns the highest level the user has in any of the guild's
+            channels"""
 
-        for channel in guild.channels:
-            userlevel = _get_guild_level(user, channel, db_user)
-            if userlevel > max_userlevel:
-                max_userlevel = userlevel
+        if not guild.channels:
+            return cls.blacklisted
+
+        member = guild.get_member(user.id)
+
+        if not member:
+            return cls.no_access
+
+        if member == guild.owner:
+            return cls.guild_owner
+
+        if db_user and db_user.is_blacklisted(guild):
+            return cls.guild_blacklisted
+
+        if cls._can_manage_any_channel(member, guild):
+            return cls.guild_admin
+
+        if db_user and db_user.is_admin(guild):
+            return cls.guild_bot_admin
+
+        return cls.guild_user
+
+    @staticmethod
+    def _can_manage_any_channel(member, guild):
+        permissions = member.guild_permissions
+
+        if permissions.administrator:
+            return True
+
+        if overwrite_index:
+            overwrites = overwrite_index.get(guild)
+        else:
+            overwrites = GuildOverwrites(guild)
+
+        if permissions.manage_channels:
+            # without connect, permissions_for takes manage_channels away in
+            # voice channels
+            if permissions.view_channel and (
+                overwrites.plain
+                or overwrites.plain_voice and permissions.connect
+            ):
+                return True
+
+            channels = overwrites.touching
+
+        else:
+            # only an overwrite can grant it
+            channels = overwrites.allowing
 
-        return max_userlevel
+        return any(
+            channel.permissions_for(member).manage_channels
+            for channel in channels
+        )
 
     @classmethod
     def _get_private_level(cls, user, channel):
@@ -15,6 +15,8 @@ class ReactionRole(Model):
         ['message_did', 'emoji'],
     ]
 
+    _cache_size = 1000
+
     @property
     def channel(self):
         return self.bot.get_channel(self.channel_did)
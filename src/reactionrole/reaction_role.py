@@ -12,7 +12,7 @@ class ReactionRole:
                            self.on_raw_reaction_remove)
 
     async def on_raw_reaction_add(self, event):
-        reactionrole = self.get_reactionrole(event)
+        reactionrole = await self.get_reactionrole(event)
 
         if not reactionrole:
             return
@@ -25,14 +25,14 @@ class ReactionRole:
         await member.add_roles(reactionrole.role,
                                reason='User reacted for role')
 
-    def get_reactionrole(self, event):
-        return self.bot.database.ReactionRole.get_by(
+    async def get_reactionrole(self, event):
+        return await self.bot.database.ReactionRole.aget_by(
             message_did=event.message_id,
-            emoji=event.emoji.id or event.emoji.name
+            emoji=str(event.emoji.id or event.emoji.name)
         )
 
     async def on_raw_reaction_remove(self, event):
-        reactionrole = self.get_reactionrole(event)
+        reactionrole = await self.get_reactionrole(event)
 
         if not reactionrole:
             return
@@ -0,0 +1,113 @@
+import re
+import json
+import time
+import logging
+
+from collections import OrderedDict
+from .models.vreddit_post import VRedditPost
+
+
+post_id_pattern = re.compile(r'/comments/([a-z0-9]+)', re.IGNORECASE)
+
+MISSING = object()
+
+
+class MetadataCache:
+    """Remembers what RedditVideo.populate found for each post.
+
+        Posts are kept in memory and, if enabled, in the database so they
+        survive restarts. Posts without a video are remembered too, for a
+        shorter time, and are stored as None."""
+
+    def __init__(self, bot, settings):
+        self.bot = bot
+        self.settings = settings
+
+        self._entries = OrderedDict()  # post key -> metadata, expiry
+
+        self.hits = 0
+        self.misses = 0
+
+        if settings.persist_metadata:
+            bot.database.add_models(VRedditPost)
+
+    @staticmethod
+    def get_key(url):
+        match = post_id_pattern.search(url)
+        if match:
+            return 'post:' + match.group(1).lower()
+
+        return url.split('?')[0].rstrip('/').lower()
+
+    async def get(self, url):
+        """Returns the metadata stored for a post, None if the post has no
+            video or MISSING if nothing is known about it"""
+
+        key = self.get_key(url)
+        now = time.time()
+
+        try:
+            metadata, expiry = self._entries[key]
+
+            if expiry > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return metadata
+
+            del self._entries[key]
+
+        except KeyError:
+            pass
+
+        if self.settings.persist_metadata:
+            post = await self.bot.database.VRedditPost.aget_by(post_key=key)
+
+            if post and post.expires > now:
+                metadata = json.loads(post.data) if post.data else None
+                self._remember(key, metadata, post.expires)
+                self.hits += 1
+                return metadata
+
+        self.misses += 1
+        return MISSING
+
+    async def store(self, url, metadata):
+        key = self.get_key(url)
+
+        if metadata is None:
+            expiry = time.time() + self.settings.metadata_negative_ttl
+        else:
+            expiry = time.time() + self.settings.metadata_ttl
+
+        self._remember(key, metadata, expiry)
+
+        if not self.settings.persist_metadata:
+            return
+
+        # several links to the same post can be stored at once, so this
+        # replaces the row in one statement instead of looking it up first
+        query = """
+            INSERT OR REPLACE INTO {} ( post_key, data, expires )
+            VALUES ( ?, ?, ? )
+        """.format(VRedditPost._table)
+
+        data = json.dumps(metadata) if metadata else ''
+        await self.bot.database.aio.execute(query, (key, data, expiry))
+
+    def _remember(self, key, metadata, expiry):
+        self._entries[key] = (metadata, expiry)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.settings.metadata_cache_size:
+            self._entries.popitem(last=False)
+
+    async def prune(self):
+        if not self.settings.persist_metadata:
+            return
+
+        await self.bot.database.aio.execute(
+            'DELETE FROM {} WHERE expires < ?'.format(VRedditPost._table),
+            time.time()
+        )
+
+        logging.debug('expired vreddit posts pruned')
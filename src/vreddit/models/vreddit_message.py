@@ -3,6 +3,8 @@ from discord import NotFound, Forbidden
 
 
 class VRedditMessage(Model):
+    __slots__ = ('_channel', )
+
     _table = 'vreddit_message'
 
     _fields = {
@@ -17,6 +19,8 @@ class VRedditMessage(Model):
         ['channel_did', 'dest_message_did'],
     ]
 
+    _cache_size = 1000
+
     def get_channel(self):
         try:
             return self._channel
@@ -25,40 +29,25 @@ class VRedditMessage(Model):
             self._channel = self.bot.get_channel(self.channel_did)
             return self._channel
 
-    async def get_src_message(self):
-        try:
-            return self._src_message
+    # messages aren't kept on the instance, cached models would otherwise
+    # hold on to them for as long as they stay in the cache
 
-        except AttributeError:
-            channel = self.get_channel()
-            if not channel:
-                self._src_message = None
-
-            else:
-                self._src_message = await channel.fetch_message(
-                    self.src_message_did
-                )
+    async def get_src_message(self):
+        channel = self.get_channel()
+        if not channel:
+            return None
 
-            return self._src_message
+        return await channel.fetch_message(self.src_message_did)
 
     async def get_dest_message(self):
         if not self.dest_message_did:
             return None
 
-        try:
-            return self._dest_message
-
-        except AttributeError:
-            channel = self.get_channel()
-            if not channel:
-                self._dest_message = None
-
-            else:
-                self._dest_message = await channel.fetch_message(
-                    self.dest_message_did
-                )
+        channel = self.get_channel()
+        if not channel:
+            return None
 
-            return self._dest_message
+        return await channel.fetch_message(self.dest_message_did)
 
     def delete(self, delete_discord_message=True):
         if delete_discord_message:
@@ -66,6 +55,12 @@ class VRedditMessage(Model):
 
         super().delete()
 
+    async def adelete(self, delete_discord_message=True):
+        if delete_discord_message:
+            self.bot.loop.create_task(self.delete_message())
+
+        await super().adelete()
+
     async def delete_message(self):
         try:
             message = await self.get_dest_message()
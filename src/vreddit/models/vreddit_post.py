@@ -0,0 +1,19 @@
+from levbot.database import Model, Required
+
+
+class VRedditPost(Model):
+    _table = 'vreddit_post'
+
+    _fields = {
+        'post_key': Required(str),
+        'data': '',  # JSON metadata, empty for posts without a video
+        'expires': Required(float),
+    }
+
+    _indexes = [
+        'expires',
+    ]
+
+    _unique_indexes = [
+        'post_key',
+    ]
@@ -7,6 +7,8 @@ import logging
 import xml.etree.ElementTree as ET
 
 from uuid import uuid1 as uuid
+from .metadata_cache import MISSING
+from .transcoder import Transcoder
 
 
 rmtree = functools.partial(shutil.rmtree, ignore_errors=True)
@@ -20,20 +22,44 @@ class VideoError(Exception):
     pass
 
 
+class RequestError(Exception):
+    pass
+
+
 class RedditVideo:
-    def __init__(self, url, temp_directory, *, loop=None):
+    metadata_fields = (
+        'title', 'short_url', 'audio_url', 'video_url', 'height', 'width',
+        'duration', 'quarantine', 'nsfw', 'spoiler',
+    )
+
+    def __init__(self, url, temp_directory, *, loop=None, session=None,
+                 metadata_cache=None, video_cache=None, transcoder=None):
         self.url = url
         self.working_dir = os.path.join(temp_directory, str(uuid()))
         self._populated = False
+        self.metadata_cache = metadata_cache
+        self.video_cache = video_cache
+        self.transcoder = transcoder
+
+        # a session passed in is borrowed and left open
+        self.http_session = session
+        self._owns_session = session is None
 
         self.loop = loop or asyncio.get_event_loop()
 
     async def __aenter__(self):
         os.makedirs(self.working_dir, exist_ok=True)
-        self.http_session = await aiohttp.ClientSession().__aenter__()
+
+        if self._owns_session:
+            self.http_session = await aiohttp.ClientSession().__aenter__()
+
         return self
 
     async def __aexit__(self, *args, **kwargs):
+        if not self._owns_session:
+            return await self.loop.run_in_executor(None, rmtree,
+                                                   self.working_dir)
+
         await asyncio.gather(
             self.loop.run_in_executor(None, rmtree, self.working_dir),
             self.http_session.__aexit__(*args, **kwargs)
@@ -50,6 +76,17 @@ class RedditVideo:
             logging.info('No video found at ' + self.url)
             return None
 
+        if self.video_cache:
+            cached = await self.video_cache.get(self.url, max_file_size,
+                                                self.working_dir)
+
+            if cached:
+                video_file, info = cached
+                self.file_size = info['file_size']
+                self.final_file_size = info['final_file_size']
+                self.is_clipped = info['is_clipped']
+                return video_file
+
         video_file, audio_file = await asyncio.gather(
             self.download_file('v.mp4', self.video_url),
             self.download_file('a.mp4', self.audio_url)
@@ -65,17 +102,64 @@ class RedditVideo:
             video_file = await self.ensure_size(video_file, max_file_size)
             self.final_file_size = os.path.getsize(video_file)
 
+        if self.video_cache:
+            await self.video_cache.store(self.url, max_file_size, video_file, {
+                'file_size': self.file_size,
+                'final_file_size': self.final_file_size,
+                'is_clipped': self.is_clipped,
+            })
+
         return video_file
 
+    @property
+    def metadata(self):
+        return {field: getattr(self, field) for field in self.metadata_fields}
+
+    @metadata.setter
+    def metadata(self, metadata):
+        for field in self.metadata_fields:
+            setattr(self, field, metadata[field])
+
+        self.is_clipped = False
+        self._populated = True
+
     async def populate(self):
         if self.is_populated:
             return
 
+        if not self.metadata_cache:
+            return await self._populate()
+
+        metadata = await self.metadata_cache.get(self.url)
+
+        if metadata is None:
+            raise PostError('Reddit post must contain a video')
+
+        if metadata is not MISSING:
+            self.metadata = metadata
+            return
+
+        try:
+            await self._populate()
+
+        except PostError:
+            await self.metadata_cache.store(self.url, None)
+            raise
+
+        await self.metadata_cache.store(self.url, self.metadata)
+
+    async def _populate(self):
         # remove trailing data that breaks adding the .json
         url = self.url.split('?')[0]
 
         async with self.http_session.get(url + '.json') as resp:
-            data = await resp.json()
+            self._check_response(resp)
+
+            try:
+                data = await resp.json()
+
+            except aiohttp.ContentTypeError:
+                raise RequestError(f'{url} did not return JSON')
 
         main_data = data[0]['data']['children'][0]['data']
 
@@ -96,6 +180,7 @@ class RedditVideo:
             self.spoiler = main_data['spoiler']
 
             async with self.http_session.get(video_data['dash_url']) as resp:
+                self._check_response(resp)
                 dash_root = ET.fromstring(await resp.text())
 
             dash_sets = dash_root.iter('{urn:mpeg:dash:schema:mpd:2011}AdaptationSet')
@@ -117,6 +202,13 @@ class RedditVideo:
 
         self._populated = True
 
+    @staticmethod
+    def _check_response(resp):
+        # errors like rate limiting are temporary, and mustn't be mistaken
+        # for (and cached as) a post without a video
+        if resp.status != 200:
+            raise RequestError(f'{resp.url} returned HTTP {resp.status}')
+
     async def download_file(self, filename, url, chunk_size=1024):
         if not url:
             return None
@@ -144,11 +236,17 @@ class RedditVideo:
             f' -map 0:v:0 -map 1:a:0 "{result_file}"'
         )
 
+        await self.run_ffmpeg(cmd, Transcoder.MERGE)
+
+        return result_file
+
+    async def run_ffmpeg(self, cmd, priority):
         logging.info('Running command: ' + cmd)
 
-        await self.loop.run_in_executor(None, os.system, cmd)
+        if self.transcoder:
+            return await self.transcoder.run(cmd, priority)
 
-        return result_file
+        return await self.loop.run_in_executor(None, os.system, cmd)
 
     async def ensure_size(self, video_file, max_file_size):
         video_file = await self.squish_file(video_file, max_file_size)
@@ -193,9 +291,7 @@ class RedditVideo:
             f' "{result_file}"'
         )
 
-        logging.info('Running command: ' + cmd)
-
-        await self.loop.run_in_executor(None, os.system, cmd)
+        await self.run_ffmpeg(cmd, Transcoder.ENCODE)
 
         return result_file
 
@@ -209,8 +305,6 @@ class RedditVideo:
             f' "{result_file}"'
         )
 
-        logging.info('Running command: ' + cmd)
-
-        await self.loop.run_in_executor(None, os.system, cmd)
+        await self.run_ffmpeg(cmd, Transcoder.CLIP)
 
         return result_file
@@ -0,0 +1,106 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Transcoder:
+    """Runs ffmpeg commands, a limited number at a time.
+
+        Commands beyond the limit wait in a priority queue, so quick stream
+        copies don't have to wait behind two-pass encodes."""
+
+    # lower runs first
+    MERGE = 0
+    CLIP = 1
+    ENCODE = 2
+
+    priority_names = {MERGE: 'merge', CLIP: 'clip', ENCODE: 'encode'}
+
+    def __init__(self, max_processes, *, loop=None):
+        self.max_processes = max_processes
+        self.loop = loop or asyncio.get_event_loop()
+
+        self._executor = ThreadPoolExecutor(max_processes, 'ffmpeg')
+        self._waiting = []  # heap of (priority, order, future)
+        self._order = itertools.count()
+
+        self.running = 0
+        self.started = {priority: 0 for priority in self.priority_names}
+        self.total_wait = {priority: 0.0 for priority in self.priority_names}
+        self.max_wait = {priority: 0.0 for priority in self.priority_names}
+
+    @property
+    def queued(self):
+        return sum(1 for _, _, future in self._waiting if not future.done())
+
+    async def run(self, cmd, priority):
+        """Runs a shell command once a slot is free, returning its status"""
+
+        queued_at = time.monotonic()
+
+        if self.running >= self.max_processes or self.queued:
+            await self._wait_for_slot(priority)
+
+        else:
+            self.running += 1
+
+        self._record_wait(priority, time.monotonic() - queued_at)
+
+        future = self.loop.run_in_executor(self._executor, os.system, cmd)
+
+        try:
+            return await asyncio.shield(future)
+
+        finally:
+            # a cancelled caller can't stop ffmpeg, the slot stays taken
+            # until it exits
+            if future.done():
+                self._release()
+            else:
+                future.add_done_callback(lambda _: self._release())
+
+    async def _wait_for_slot(self, priority):
+        future = self.loop.create_future()
+        heapq.heappush(self._waiting, (priority, next(self._order), future))
+
+        try:
+            await future
+
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over just as we were cancelled
+                self._release()
+
+            raise
+
+    def _release(self):
+        self.running -= 1
+
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+
+            if not future.done():
+                self.running += 1
+                future.set_result(None)
+                break
+
+    def _record_wait(self, priority, wait):
+        self.started[priority] += 1
+        self.total_wait[priority] += wait
+        self.max_wait[priority] = max(self.max_wait[priority], wait)
+
+    def get_report_lines(self):
+        yield 'ffmpeg: {}/{} running, {} queued'.format(
+            self.running, self.max_processes, self.queued
+        )
+
+        for priority, name in self.priority_names.items():
+            count = self.started[priority]
+            mean = self.total_wait[priority] / count if count else 0.0
+
+            yield '{:<7} {:>6} started, waited {:>6.1f}s mean {:>6.1f}s max' \
+                .format(name, count, mean, self.max_wait[priority])
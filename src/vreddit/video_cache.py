@@ -0,0 +1,162 @@
+import os
+import json
+import shutil
+import asyncio
+import logging
+import tempfile
+
+from collections import OrderedDict
+from .metadata_cache import MetadataCache
+
+
+class VideoCache:
+    """Keeps finished videos on disk so posts linked again skip the work.
+
+        Videos are stored per post and maximum file size, next to a JSON
+        file with the details the embed needs. Files are written under a
+        temporary name and moved into place, and the least recently used
+        ones are removed once the cache grows past its size limit. Hits are
+        linked into the caller's own directory, so removing an entry can't
+        pull a file out from under an upload."""
+
+    def __init__(self, directory, max_bytes, *, loop=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        self.loop = loop or asyncio.get_event_loop()
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._sizes = self._scan()  # path -> size, least recently used first
+        self.total = sum(self._sizes.values())
+
+    def _scan(self):
+        videos = []
+
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.tmp'):
+                # left behind by a write that never finished
+                os.remove(entry.path)
+
+            elif entry.name.endswith('.mp4'):
+                stat = entry.stat()
+                videos.append((stat.st_mtime, entry.path, stat.st_size))
+
+        videos.sort()
+
+        return OrderedDict((path, size) for _, path, size in videos)
+
+    def get_path(self, url, max_file_size):
+        key = MetadataCache.get_key(url)
+        name = ''.join(c if c.isalnum() else '_' for c in key)
+
+        return os.path.join(self.directory, f'{name}-{max_file_size}.mp4')
+
+    async def get(self, url, max_file_size, directory):
+        """Links the cached video into `directory`, returning the linked file
+            and its details, or None"""
+
+        path = self.get_path(url, max_file_size)
+        cached = None
+
+        if path in self._sizes:
+            cached = await self.loop.run_in_executor(None, self._get, path,
+                                                     directory)
+
+        if cached:
+            self._sizes.move_to_end(path)
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        return cached
+
+    @staticmethod
+    def _get(path, directory):
+        filename = os.path.join(directory, os.path.basename(path))
+
+        try:
+            with open(path + '.json') as file:
+                info = json.load(file)
+
+            try:
+                os.link(path, filename)
+
+            except OSError:
+                shutil.copyfile(path, filename)
+
+            # the modification time doubles as the last use, for ordering
+            # the entries after a restart
+            os.utime(path)
+
+        except (OSError, ValueError):
+            return None
+
+        return filename, info
+
+    async def store(self, url, max_file_size, filename, info):
+        path = self.get_path(url, max_file_size)
+
+        try:
+            size = await self.loop.run_in_executor(None, self._store, path,
+                                                   filename, info)
+
+        except OSError:
+            logging.exception('Unable to cache video')
+            return
+
+        self.total += size - self._sizes.pop(path, 0)
+        self._sizes[path] = size
+
+        await self._evict()
+
+    def _store(self, path, filename, info):
+        def copy(file):
+            with open(filename, 'rb') as source:
+                shutil.copyfileobj(source, file)
+
+        self._write(path, copy, 'wb')
+
+        # written last, since its presence marks the video as complete
+        self._write(path + '.json', lambda file: json.dump(info, file), 'w')
+
+        return os.path.getsize(path)
+
+    def _write(self, path, write, mode):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        try:
+            with open(fd, mode) as file:
+                write(file)
+
+            os.replace(temp_path, path)
+
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    async def _evict(self):
+        paths = []
+
+        while self.total > self.max_bytes and self._sizes:
+            path, size = self._sizes.popitem(last=False)
+            self.total -= size
+            paths.append(path)
+
+        if paths:
+            await self.loop.run_in_executor(None, self._remove, paths)
+
+    @staticmethod
+    def _remove(paths):
+        for path in paths:
+            for filename in (path + '.json', path):
+                try:
+                    os.remove(filename)
+
+                except OSError:
+                    pass
+
+            logging.info(f'Removed {path} from the video cache')
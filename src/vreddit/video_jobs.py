@@ -0,0 +1,138 @@
+import asyncio
+import logging
+
+
+class Subscription:
+    def __init__(self, job):
+        self.job = job
+        self.future = job.loop.create_future()
+        self.abandoned = False
+
+    async def wait(self):
+        """Returns the job's result, or None if the subscription was
+            abandoned first"""
+
+        return await self.future
+
+
+class VideoJob:
+    def __init__(self, key, loop):
+        self.key = key
+        self.loop = loop
+
+        self.subscriptions = set()
+        self.result = None
+        self.finished = False
+        self.released = asyncio.Event()
+        self.task = None
+
+
+class VideoJobs:
+    """Makes sure each video is only prepared once at a time.
+
+        Requests for a video that's already being prepared subscribe to the
+        running job instead of starting another one. The job keeps its
+        working files until every subscriber has released it, and is
+        cancelled if all of them abandon it before it's done."""
+
+    def __init__(self, *, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self._jobs = {}
+
+        self.started = 0
+        self.joined = 0
+
+    @property
+    def in_flight(self):
+        return len(self._jobs)
+
+    def subscribe(self, key, run):
+        """Subscribes to the job for `key`, starting it if needed
+
+            `run(job)` is a coroutine function that prepares the video, calls
+            `job_done(job, result)` and then waits for `job.released` before
+            cleaning up."""
+
+        job = self._jobs.get(key)
+
+        if job is None:
+            job = self._jobs[key] = VideoJob(key, self.loop)
+            job.task = self.loop.create_task(self._run(job, run))
+            self.started += 1
+
+        else:
+            self.joined += 1
+
+        subscription = Subscription(job)
+        job.subscriptions.add(subscription)
+
+        if job.finished:
+            subscription.future.set_result(job.result)
+
+        return subscription
+
+    async def _run(self, job, run):
+        try:
+            await run(job)
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as ex:
+            self._fail(job, ex)
+
+        finally:
+            # a job that stops early can't be shared any more
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+            if not job.finished:
+                self._fail(job, RuntimeError('Video job ended early'))
+
+    def job_done(self, job, result):
+        job.result = result
+        job.finished = True
+
+        for subscription in job.subscriptions:
+            if not subscription.future.done():
+                subscription.future.set_result(result)
+
+    def _fail(self, job, exception):
+        job.finished = True
+
+        for subscription in job.subscriptions:
+            if not subscription.future.done():
+                subscription.future.set_exception(exception)
+
+    def abandon(self, subscription):
+        """Gives up on a result, e.g. because the message asking for it was
+            deleted"""
+
+        subscription.abandoned = True
+
+        if not subscription.future.done():
+            subscription.future.set_result(None)
+
+        self.release(subscription)
+
+    def release(self, subscription):
+        """Tells the job a subscriber is done with its result"""
+
+        job = subscription.job
+
+        if subscription not in job.subscriptions:
+            return
+
+        job.subscriptions.remove(subscription)
+
+        if job.subscriptions:
+            return
+
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+
+        job.released.set()
+
+        if not job.finished:
+            logging.info(f'Video job {job.key} abandoned, cancelling')
+            job.task.cancel()
@@ -1,13 +1,16 @@
 import re
 import asyncio
-import aiohttp
 import logging
 import tempfile
 
 from discord import Embed, NotFound, Forbidden, File
 from discord.abc import PrivateChannel
 from .models.vreddit_message import VRedditMessage
-from .reddit_video import RedditVideo, PostError
+from .reddit_video import RedditVideo, PostError, RequestError
+from .metadata_cache import MetadataCache
+from .video_cache import VideoCache
+from .video_jobs import VideoJobs
+from .transcoder import Transcoder
 from levbot import UserLevel
 
 
@@ -26,15 +29,39 @@ class VReddit:
         )
 
         bot.database.add_models(VRedditMessage)
+        self.metadata_cache = MetadataCache(bot, self.settings)
+        self.jobs = VideoJobs(loop=bot.loop)
+        self.transcoder = Transcoder(self.settings.ffmpeg_processes,
+                                     loop=bot.loop)
+        self.subscriptions = {}  # source message id -> job subscription
+        self.video_cache = None
+
+        if self.settings.video_cache_size:
+            self.video_cache = VideoCache(
+                self.settings.video_cache_directory.format(
+                    temp_directory=self.settings.temp_directory
+                ),
+                self.settings.video_cache_size * 1048576
+            )
 
         bot.register_event('on_ready', self.on_ready)
-        bot.register_event('on_message', self.on_message)
+        # edits still go to every handler, as removing a url has to remove
+        # the embed as well
+        bot.message_classifier.add_pattern('vreddit', url_pattern)
+        bot.register_event('on_message', self.on_message,
+                           message_classes=('vreddit',))
         bot.register_event('on_message_edit', self.on_message_edit)
         bot.register_event('on_message_delete', self.on_message_delete)
         bot.register_event('on_reaction_add', self.on_reaction_add)
 
+        bot.commands.register_handler(
+            'stats vreddit',
+            self.cmd_stats_vreddit,
+            user_level=UserLevel.bot_owner
+        )
+
     async def on_ready(self):
-        for message in self.bot.database.VRedditMessage.get_list(
+        for message in await self.bot.database.VRedditMessage.aget_list(
                 order_by='id DESC', limit=50):
             try:
                 src_message = await message.get_src_message()
@@ -49,10 +76,31 @@ class VReddit:
                 self.add_message_to_cache(dest_message)
 
             else:
-                message.delete()
+                await message.adelete()
 
         logging.info('old messages fetched')
 
+        await self.metadata_cache.prune()
+
+    async def cmd_stats_vreddit(self, message):
+        """Shows the ffmpeg queue, jobs in progress and cache use"""
+
+        lines = list(self.transcoder.get_report_lines())
+
+        lines.append('jobs: {} in progress, {} started, {} joined'.format(
+            self.jobs.in_flight, self.jobs.started, self.jobs.joined
+        ))
+        lines.append('post cache: {} hits, {} misses'.format(
+            self.metadata_cache.hits, self.metadata_cache.misses
+        ))
+
+        if self.video_cache:
+            lines.append('video cache: {} hits, {} misses'.format(
+                self.video_cache.hits, self.video_cache.misses
+            ))
+
+        await message.channel.send('```\n{}\n```'.format('\n'.join(lines)))
+
     def add_message_to_cache(self, message):
         self.bot._connection._messages.append(message)
 
@@ -69,7 +117,7 @@ class VReddit:
             return
 
         url = await self.get_long_url(smessage.content)
-        vmessage = self.get_vmessage(smessage)
+        vmessage = await self.get_vmessage(smessage)
 
         if vmessage:
             if url == vmessage.src_url:
@@ -77,7 +125,8 @@ class VReddit:
                 return
 
             # url changed - delete old embed, start over
-            vmessage.delete()
+            self.abandon_job(smessage)
+            await vmessage.adelete()
 
         if not url:
             # no url to handle
@@ -89,25 +138,34 @@ class VReddit:
         vmessage.src_url = url
         vmessage.channel_did = smessage.channel.id
         vmessage.src_message_did = smessage.id
-        vmessage.save()
+        await vmessage.asave()
 
-        async with RedditVideo(url, self.settings.temp_directory) as video:
-            try:
-                await video.populate()
-            except PostError:
-                logging.info('No video found')
-                return vmessage.delete()
+        # the same post linked in several places at once is only prepared
+        # once, every message waits for the same job
+        key = (self.metadata_cache.get_key(url), 25)
+        subscription = self.jobs.subscribe(
+            key, lambda job: self.prepare_video(job, url, 25)
+        )
+        self.subscriptions[smessage.id] = subscription
 
+        try:
             with smessage.channel.typing():
-                filename = await video.get_video_file(max_file_size=25)
-                if not filename:
+                result = await subscription.wait()
+
+                if subscription.abandoned:
+                    # source message deleted or edited while we waited
+                    return
+
+                if not result:
                     # no video at this url
-                    return vmessage.delete()
+                    return await vmessage.adelete()
 
-                if not vmessage.exists():
+                if not await vmessage.aexists():
                     # check that nothing's changed since we started
                     return
 
+                video, filename = result
+
                 dmessage = await smessage.channel.send(
                     file=File(
                         filename,
@@ -120,9 +178,15 @@ class VReddit:
                     )
                 )
 
-        if vmessage.exists():
+        finally:
+            if self.subscriptions.get(smessage.id) is subscription:
+                del self.subscriptions[smessage.id]
+
+            self.jobs.release(subscription)
+
+        if await vmessage.aexists():
             vmessage.dest_message_did = dmessage.id
-            vmessage.save()
+            await vmessage.asave()
 
             await asyncio.gather(
                 dmessage.add_reaction('❌'),
@@ -133,6 +197,34 @@ class VReddit:
             # dang it, link deleted while we're uploading!
             await dmessage.delete()
 
+    async def prepare_video(self, job, url, max_file_size):
+        async with RedditVideo(url, self.settings.temp_directory,
+                               session=self.bot.http_session,
+                               metadata_cache=self.metadata_cache,
+                               video_cache=self.video_cache,
+                               transcoder=self.transcoder) as video:
+            try:
+                await video.populate()
+            except PostError:
+                logging.info('No video found')
+                return self.jobs.job_done(job, None)
+
+            except RequestError as ex:
+                logging.warning(f'Unable to fetch post: {ex}')
+                return self.jobs.job_done(job, None)
+
+            filename = await video.get_video_file(max_file_size)
+            self.jobs.job_done(job, (video, filename) if filename else None)
+
+            # the working directory has to stay until everyone has uploaded
+            await job.released.wait()
+
+    def abandon_job(self, smessage):
+        subscription = self.subscriptions.pop(smessage.id, None)
+
+        if subscription:
+            self.jobs.abandon(subscription)
+
     async def get_long_url(self, s):
         url = self.get_url(s)
         if not url:
@@ -148,8 +240,7 @@ class VReddit:
         return match.group(0) if match else ''
 
     async def resolve_redirects(self, url):
-        async with aiohttp.ClientSession() as session:
-            return await self._resolve_redirects(url, session)
+        return await self._resolve_redirects(url, self.bot.http_session)
 
     async def _resolve_redirects(self, url, session):
         async with session.head(url) as resp:
@@ -165,14 +256,14 @@ class VReddit:
 
             return url
 
-    def get_vmessage(self, smessage, by_source=True):
+    async def get_vmessage(self, smessage, by_source=True):
         if by_source:
-            return self.bot.database.VRedditMessage.get_by(
+            return await self.bot.database.VRedditMessage.aget_by(
                 channel_did=smessage.channel.id,
                 src_message_did=smessage.id
             )
 
-        return self.bot.database.VRedditMessage.get_by(
+        return await self.bot.database.VRedditMessage.aget_by(
             channel_did=smessage.channel.id,
             dest_message_did=smessage.id
         )
@@ -236,11 +327,13 @@ class VReddit:
         if isinstance(smessage.channel, PrivateChannel):
             return
 
-        vmessage = self.get_vmessage(smessage) \
-            or self.get_vmessage(smessage, False)
+        self.abandon_job(smessage)
+
+        vmessage = await self.get_vmessage(smessage) \
+            or await self.get_vmessage(smessage, False)
 
         if vmessage:
-            vmessage.delete()
+            await vmessage.adelete()
 
     async def on_reaction_add(self, reaction, user):
         if reaction.emoji != '❌':
@@ -252,10 +345,10 @@ class VReddit:
         if user == self.bot.user:
             return
 
-        vmessage = self.get_vmessage(reaction.message, False)
+        vmessage = await self.get_vmessage(reaction.message, False)
         smessage = await vmessage.get_src_message()
 
         if UserLevel.get(user, reaction.message.channel) \
            >= UserLevel.guild_bot_admin or user == smessage.author:
-            vmessage.delete()
+            await vmessage.adelete()
             await smessage.edit(suppress=False)
@@ -7,3 +7,10 @@ def get_category():
 
 class VRedditCategory(settings.Category):
     temp_directory = '{sys_temp}/vreddit'
+    metadata_ttl = 3600  # seconds
+    metadata_negative_ttl = 600  # seconds, for posts without a video
+    metadata_cache_size = 1000
+    persist_metadata = True
+    video_cache_directory = '{temp_directory}/cache'
+    video_cache_size = 1024  # MiB, 0 disables
+    ffmpeg_processes = 2